@@ -9,11 +9,28 @@ Version 1.3 - Add current session progress
 
 """
 
+import os
+import queue
+import threading
+import time
 import tkinter as tk
+from collections import OrderedDict
 from typing import Optional
 
 import myNotebook as nb
+from rankanalytics import SessionColumns
+from rankbackfill import Backfill
+from rankcapture import CaptureWriter, capture_name
+from rankcargo import AVERAGE, FIFO
+from rankinstrument import Instruments
+from rankjournals import default_journal_dir
+from rankledger import Ledger
+from rankprofiles import ProfileCache, migrate_legacy, profile_prefix
 from ranklogger import RankLogger
+from rankcore import EVENT_HANDLERS, RANK_NAMES, RankCore, RankView
+from rankrender import LabelRenderer, estimate_text, kcr_rate_text, kcr_text, pct_text, rank_pct_text, rate_text
+from ranksnapshot import Snapshotter
+from rankstatestore import StateStore
 
 from config import appname, config
 from theme import theme
@@ -22,118 +39,242 @@ PLUGIN_NAME = "EDRankProgress"
 VERSION = "1.3"
 
 LOG = RankLogger()
-
-combat_ranks = {0: "Harmless", 1: "Mostly Harmless", 2: "Novice", 3: "Competent", 4: "Expert",
-                5: "Master", 6: "Dangerous", 7: "Deadly", 8: "Elite", 9: "Elite I", 10: "Elite II", 11: "Elite III",
-                12: "Elite IV", 13: "Elite V"}
-trade_ranks = {0: "Penniless", 1: "Mostly Penniless", 2: "Peddler", 3: "Dealer", 4: "Merchant",
-               5: "Broker", 6: "Entrepreneur", 7: "Tycoon", 8: "Elite", 9: "Elite I", 10: "Elite II", 11: "Elite III",
-               12: "Elite IV", 13: "Elite V"}
-explore_ranks = {0: "Aimless", 1: "Mostly Aimless", 2: "Scout", 3: "Surveyor", 4: "Trailblazer",
-                 5: "Pathfinder", 6: "Ranger", 7: "Pioneer", 8: "Elite", 9: "Elite I", 10: "Elite II",
-                 11: "Elite III", 12: "Elite IV", 13: "Elite V"}
-soldier_ranks = {0: "Defenceless", 1: "Mostly Defenceless", 2: "Rookie", 3: "Soldier", 4: "Gunslinger",
-                 5: "Warrior", 6: "Gladiator", 7: "Deadeye", 8: "Elite", 9: "Elite I", 10: "Elite II",
-                 11: "Elite III", 12: "Elite IV", 13: "Elite V"}
-exobiologist_ranks = {0: "Directionless", 1: "Mostly Directionless", 2: "Compiler", 3: "Collector", 4: "Cataloguer",
-                      5: "Taxonomist", 6: "Ecologist", 7: "Geneticist", 8: "Elite", 9: "Elite I", 10: "Elite II",
-                      11: "Elite III", 12: "Elite IV", 13: "Elite V"}
-federation_ranks = {0: "None", 1: "Recruit", 2: "Cadet", 3: "Midshipman", 4: "Petty Officer",
-                    5: "Chief Petty Officer", 6: "Warrant Officer", 7: "Ensign", "8": "Lieutenant",
-                    9: "Lieutenant Commander", 10: "Post Commander",
-                    11: "Post Captain", 12: "Rear Admiral", 13: "Vice Admiral", 14: "Admiral"}
-empire_ranks = {0: "None", 1: "Outsider", 2: "Serf", 3: "Master", 4: "Squire",
-                5: "Knight", 6: "Lord", 7: "Baron", 8: "Viscount", 9: "Count", 10: "Earl",
-                11: "Marquis", 12: "Duke", 13: "Prince", 14: "King"}
-
-
-class RankProgress:
+LOG_LEVELS = ("DEBUG", "INFO", "WARNING", "ERROR")
+
+# The stats server's default port, rankstatserver.PORT.  That module (and asyncio) is only imported if the server
+# is turned on
+SERVER_PORT = 8765
+
+# The display settings: name, config key, checkbox text and indent.  RankProgress keeps each one's value in
+# shown[name], and its Tk variable and checkbox in show_vars[name] and show_buttons[name]
+SHOW_SETTINGS = (
+    ("rank", "edrp_show_rank", "Show Ranks", 12),
+    ("rank_row", "edrp_show_rank_row", "Use separate row for rank", 24),
+    ("combat_stats", "edrp_show_combat_stats", "Show Combat Stats", 12),
+    ("trade_stats", "edrp_show_trade_stats", "Show Trade Stats", 12),
+    ("lifetime", "edrp_show_lifetime", "Show Lifetime Totals (from the game's statistics at login)", 12),
+    ("rates", "edrp_show_rates", "Show rates per hour and time to next rank", 12),
+    ("estimates", "edrp_show_estimates",
+     "Estimate progress from credits earned until the game next updates it (shown as ~)", 12),
+)
+
+# The progress labels: label key and rank track
+PROGRESS_LABELS = (
+    ("com", "Combat"),
+    ("trd", "Trade"),
+    ("exp", "Explore"),
+    ("merc", "Soldier"),
+    ("exo", "Exobiologist"),
+    ("emp", "Empire"),
+    ("fed", "Federation"),
+)
+
+# The credit labels: label key and RankCore counter, the credits are the last label for the key
+CREDIT_LABELS = (("bounty", "bounties_value"), ("bond", "bonds_value"), ("profit", "trade_profit"),
+                 ("exp_data", "explore_profit"))
+
+# The lifetime labels: label key and lifetime total, see RankCore.lifetime_totals
+LIFETIME_LABELS = (("life_bounty", "bounties_value"), ("life_bond", "bonds_value"), ("life_profit", "trade_profit"),
+                   ("life_exp_data", "explore_profit"), ("life_exo", "exobiology_profit"))
+
+
+class RankProgress(RankView):
     """
     RankProgress implements the EDMC plugin interface.
-    It adds 3 lines to the EDMC UI showing the progress toward ranks
+    It adds 3 lines to the EDMC UI showing the progress toward ranks from the state held in a RankCore
     """
+    BACKFILL_POLL_MS = 250
+    RATES_REFRESH_MS = 60000  # The rates fall off while nothing is earned, so are redrawn this often
+    LOG_RATE_LIMIT = 10  # seconds between repeats of a log message, when limited
+    PARKED_LIMIT = 8  # evicted profiles kept in memory, the oldest are dropped
 
     def __init__(self) -> None:
+        # This runs when EDMC imports us, so it only sets up empty state.  The config is read in on_load and the Tk
+        # variables and widgets are created when EDMC asks for the preferences or the main UI.
+        self.store = None
+        self.ledger = None
+        # Only the last active commander is loaded, others are loaded when the game switches to them
+        self.profiles = ProfileCache(self.create_profile, evict=self.park_profile)
+        # (cmdr, is_beta) -> what an evicted profile can't get back from config, the ledger or the checkpoint
+        self.parked = OrderedDict()
+        self.cmdr = None
+        self.is_beta = False
+        self.core = None
+
         # Be sure to use names that wont collide in our config variables
+        self.show_vars = dict()
+        self.cargo_fifo = None
+        self.log_level = None
+        self.log_rate_limit = None
+
+        self.show_buttons = dict()
+        self.cargo_fifo_button = None
+        self.log_rate_limit_button = None
 
-        self.combat = 0
-        self.trade = 0
-        self.explore = 0
-        self.soldier = 0
-        self.exobiologist = 0
-        self.empire = 0
-        self.federation = 0
-
-        self.combat_rank = 0
-        self.trade_rank = 0
-        self.explore_rank = 0
-        self.soldier_rank = 0
-        self.exobiologist_rank = 0
-        self.empire_rank = 0
-        self.federation_rank = 0
-
-        self.combat = config.get_int('edrp_last_combat')
-        self.trade = config.get_int('edrp_last_trade')
-        self.explore = config.get_int('edrp_last_explore')
-        self.soldier = config.get_int('edrp_last_soldier')
-        self.exobiologist = config.get_int('edrp_last_exobiologist')
-        self.empire = config.get_int('edrp_last_empire')
-        self.federation = config.get_int('edrp_last_federation')
-
-        self.combat_rank = config.get_int('edrp_last_combat_rank')
-        self.trade_rank = config.get_int('edrp_last_trade_rank')
-        self.explore_rank = config.get_int('edrp_last_explore_rank')
-        self.soldier_rank = config.get_int('edrp_last_soldier_rank')
-        self.exobiologist_rank = config.get_int('edrp_last_exobiologist_rank')
-        self.empire_rank = config.get_int('edrp_last_empire_rank')
-        self.federation_rank = config.get_int('edrp_last_federation_rank')
-
-        self.show_rank = tk.IntVar(value=config.get_int('edrp_show_rank') and 1)
-        self.show_rank_row = tk.IntVar(value=config.get_int('edrp_show_rank_row') and 1)
-        self.show_combat_stats = tk.IntVar(value=config.get_int('edrp_show_combat_stats') and 1)
-        self.show_trade_stats = tk.IntVar(value=config.get_int('edrp_show_trade_stats') and 1)
-
-        self.show_rank_button = None
-        self.show_rank_row_button = None
-        self.show_combat_stats_button = None
-        self.show_trade_stats_button = None
-
-        self.show_rank_val = config.get_int('edrp_show_rank')
-        self.show_rank_row_val = config.get_int('edrp_show_rank_row')
-        self.show_trade_stats_val = config.get_int('edrp_show_trade_stats')
-        self.show_combat_stats_val = config.get_int('edrp_show_combat_stats')
-
-        self.bounties = 0
-        self.bounties_value = 0
-        self.bonds = 0
-        self.bonds_value = 0
-
-        self.trade_profit = 0
-
-        self.explore_profit = 0
+        self.shown = {name: 0 for name, _, _, _ in SHOW_SETTINGS}
 
         self.frame = None
+        self.rates_timer = None
         self.labels = dict()
-
-        self.log_data()
+        self.rows = dict()
+        self.rows_shown = dict()
+        self.instruments = Instruments()
+        self.renderer = LabelRenderer(self.instruments.timed("ui", self.draw))
+        self.plugin_dir = None
+        self.instrument = None
+        self.instrument_label = None
+        self.server = None
+        self.serve = None
+        self.serve_port = None
+        self.capture = None
+        self.record = None
+
+        self.backfill = None
+        self.backfill_thread = None
+        self.backfill_entries = None
+        self.backfilled = False
+        # Saves the backfill checkpoint during the session, so a crash loses nothing that can't be read back
+        self.snapshots = Snapshotter(self.instruments.timed("snapshot", self.save_snapshot))
+
+    def load_state(self):
+        """
+        Read our settings and the last active commander's state, one config read
+        """
+        self.store = StateStore(config)
+        self.store.flush = self.instruments.timed("config", self.store.flush)  # Also what the flush timer calls
+        self.instruments.enabled = bool(self.store.get_int('edrp_instrument'))
+        self.shown = {name: self.store.get_int(key) for name, key, _, _ in SHOW_SETTINGS}
+        self.cmdr = self.store.get_str('edrp_last_cmdr') or None
+        self.is_beta = bool(self.store.get_int('edrp_last_cmdr_beta'))
+        self.core = self.profiles.get(self.cmdr, self.is_beta)
+        LOG.configure(level=self.store.get_str('edrp_log_level') or "INFO",
+                      rate_limit=self.LOG_RATE_LIMIT if self.store.get_int('edrp_log_rate_limit') else 0)
+
+    def create_vars(self):
+        """
+        Create the Tk variables for the preferences, the first time they are needed
+        """
+        if self.show_vars:
+            return
+        self.show_vars = {name: tk.IntVar(value=value and 1) for name, value in self.shown.items()}
+        self.cargo_fifo = tk.IntVar(value=self.store.get_int('edrp_cargo_fifo') and 1)
+        self.log_level = tk.StringVar(value=self.store.get_str('edrp_log_level') or "INFO")
+        self.log_rate_limit = tk.IntVar(value=self.store.get_int('edrp_log_rate_limit') and 1)
+        self.instrument = tk.IntVar(value=int(self.instruments.enabled))
+        self.serve = tk.IntVar(value=self.store.get_int('edrp_server') and 1)
+        self.serve_port = tk.StringVar(value=str(self.store.get_int('edrp_server_port', SERVER_PORT)))
+        self.record = tk.IntVar(value=self.store.get_int('edrp_capture') and 1)
 
     def log_data(self):
-        LOG.log("RankProgress instantiated", "INFO")
-        LOG.log(f"Progress Com={self.combat} Trd={self.trade} Exp={self.explore}", "INFO")
-        LOG.log(f"Progress Merc={self.soldier} Exo={self.exobiologist} Fed={self.federation} Emp={self.empire}", "INFO")
-        LOG.log(f"Rank Com={self.combat_rank} Trd={self.trade_rank} Exp={self.explore_rank}", "INFO")
-        LOG.log(
-            f"Rank Merc={self.soldier_rank} Exo={self.exobiologist_rank} Fed={self.federation_rank} Emp={self.empire_rank}",
-            "INFO")
+        LOG.log("RankProgress loaded", "INFO")
+        self.core.log_data()
+
+    def create_profile(self, cmdr, is_beta):
+        """
+        Load a commander's state, called by the profile cache
+        """
+        prefix = profile_prefix(cmdr, is_beta)
+        if cmdr is not None:
+            migrate_legacy(self.store, prefix)
+        ledger = None if is_beta else self.ledger  # Beta rewards aren't real
+        core = RankCore(self.store, view=self, ledger=ledger,
+                        cargo_method=FIFO if self.store.get_int('edrp_cargo_fifo') else AVERAGE, prefix=prefix)
+        core.cmdr = cmdr
+        core.analytics = SessionColumns()
+        parked = self.parked.pop((cmdr, bool(is_beta)), None)
+        if parked is not None:
+            core.restore(parked["state"])
+            core.set_session_totals(parked["totals"])  # Exact, the ledger may still be writing the last few
+            return core
+        if self.backfilled and not is_beta:
+            # Whatever was saved when they were last the active commander, check_backfill does this at startup
+            if cmdr in self.backfill.kept:
+                self.backfill.restore(core, cmdr)  # Exact, as parked ones are
+                return core
+            self.backfill.restore(core, cmdr, restore_totals=ledger is None)
+        if ledger is not None and cmdr is not None:
+            core.set_session_totals(ledger.today(cmdr))
+        return core
+
+    def park_profile(self, cmdr, is_beta, core):
+        """
+        Keep the state of a profile dropped from the cache, so it is still there if the commander comes back.
+        Their session analytics start again.
+        """
+        if self.backfilled and not is_beta and cmdr is not None:
+            self.backfill.keep(core, cmdr)  # create_profile restores it from the checkpoint
+            return
+        # Beta commanders aren't in the checkpoint, and until the backfill is in it would overwrite what is there
+        self.parked[(cmdr, bool(is_beta))] = {"state": core.snapshot(), "totals": core.session_totals()}
+        if len(self.parked) > self.PARKED_LIMIT:
+            self.parked.popitem(last=False)
+
+    def switch_cmdr(self, cmdr, is_beta):
+        """
+        Make a commander the active one and show their state
+        """
+        if self.backfilled and not self.is_beta and self.cmdr is not None:
+            self.backfill.keep(self.core, self.cmdr)  # The commander we are leaving, saved with the next snapshot
+        self.cmdr = cmdr
+        self.is_beta = bool(is_beta)
+        self.core = self.profiles.get(cmdr, is_beta)
+        self.store.set('edrp_last_cmdr', cmdr)
+        self.store.set('edrp_last_cmdr_beta', int(self.is_beta))
+        self.update_stats()
+        self.update_combat_stats()
+
+    def journal_entry(self, cmdr, is_beta, system, station, entry, state):
+        if self.capture is not None:
+            self.capture.record(cmdr, is_beta, system, station, entry)
+        if entry["event"] == "Fileheader":
+            self.backfill.new_journal()
+        if cmdr is not None and (cmdr != self.cmdr or bool(is_beta) != self.is_beta):
+            self.switch_cmdr(cmdr, is_beta)
+        if not self.instruments.enabled:
+            self.core.journal_entry(cmdr, is_beta, system, station, entry, state)
+        else:
+            start = time.perf_counter_ns()
+            self.core.journal_entry(cmdr, is_beta, system, station, entry, state)
+            self.instruments.event(entry, (time.perf_counter_ns() - start) // 1000)
+        if entry["event"] in EVENT_HANDLERS:  # After it is counted, a snapshot marks it as read
+            self.snapshots.changed()
+
+    def save_snapshot(self):
+        if not self.backfilled:
+            return
+        if self.is_beta:  # Beta is never backfilled, so there is nothing to save, just mark its events read
+            self.backfill.save(None)
+        else:
+            self.backfill.save(self.core, self.cmdr)
 
-    def on_load(self) -> str:
+    def on_load(self, plugin_dir: str) -> str:
         """
         on_load is called by plugin_start3 below.
 
         It is the first point EDMC interacts with our code after loading our module.
+        We start reading the journals already on disk in the background, see check_backfill.
 
+        :param plugin_dir: our plugin directory
         :return: The name of the plugin, which will be used by EDMC for logging and for the settings window
         """
+        start = time.perf_counter()
+        self.plugin_dir = plugin_dir
+        self.load_state()
+        self.log_data()
+        try:
+            self.ledger = Ledger(os.path.join(plugin_dir, "ledger.db"))
+        except Exception as e:  # The plugin still works without the ledger
+            LOG.log("Unable to open the ledger: %s", "WARNING", e)
+        if not self.is_beta:
+            self.core.ledger = self.ledger
+        self.backfill = Backfill(default_journal_dir(config), os.path.join(plugin_dir, "snapshot.edrp"),
+                                 legacy_path=os.path.join(plugin_dir, "backfill.json"), background=True)
+        self.backfill_thread = threading.Thread(target=self.run_backfill, name="EDRankProgress backfill",
+                                                daemon=True)
+        self.backfill_thread.start()
+        self.setup_server()
+        self.setup_capture()
+        LOG.log("Started in %.1fms", "INFO", (time.perf_counter() - start) * 1000)
         return PLUGIN_NAME
 
     def on_unload(self) -> None:
@@ -143,6 +284,99 @@ class RankProgress:
         It is the last thing called before EDMC shuts down. Note that blocking code here will hold the shutdown process.
         """
         self.on_preferences_closed("", False)  # Save our prefs
+        self.store.flush()
+        self.save_snapshot()
+        self.backfill.close()  # Wait for the snapshot to be written
+        if self.rates_timer is not None:
+            self.frame.after_cancel(self.rates_timer)
+            self.rates_timer = None
+        if self.ledger is not None:
+            self.ledger.close()
+        if self.server is not None:
+            self.server.stop()
+        if self.capture is not None:
+            self.capture.close()
+        RankLogger.stop()  # Write out anything still queued
+
+    def setup_server(self):
+        """
+        Start or stop the stats server for the current settings
+        """
+        wanted = self.store.get_int('edrp_server')
+        port = self.store.get_int('edrp_server_port', SERVER_PORT)
+        if self.server is not None and (not wanted or self.server.port != port):
+            self.server.stop()
+            self.server = None
+        if wanted and self.server is None:
+            from rankstatserver import StatServer  # Not imported at startup, few people use it
+            server = StatServer(port=port)
+            if server.start():  # Otherwise it is tried again when the settings are next changed
+                self.server = server
+                self.server.publish(self.core.state())
+
+    def setup_capture(self):
+        """
+        Start or stop recording the journal events to a capture file in our plugin directory, see rankcapture.py
+        """
+        wanted = self.store.get_int('edrp_capture')
+        if self.capture is not None and not wanted:
+            self.capture.close()
+            self.capture = None
+        if wanted and self.capture is None:
+            path = os.path.join(self.plugin_dir, capture_name())
+            try:
+                self.capture = CaptureWriter(path)
+                LOG.log("Recording journal events to %s", "INFO", path)
+            except OSError as e:
+                LOG.log("Unable to record journal events: %s", "WARNING", e)
+
+    def run_backfill(self):
+        """
+        Runs on the backfill thread, the results are applied on the Tk thread by check_backfill
+        """
+        try:
+            self.backfill_entries = self.backfill.scan()
+        except Exception as e:  # Never let the backfill take the plugin down
+            LOG.log("Backfill failed: %s", "WARNING", e)
+            self.backfill_entries = []
+
+    def check_backfill(self):
+        if self.backfill_thread is None:
+            return
+        if self.backfill_thread.is_alive():
+            self.frame.after(self.BACKFILL_POLL_MS, self.check_backfill)
+            return
+        # The backfill reads the live journals, which are for the last commander that played
+        if self.backfill.cmdr is not None and (self.backfill.cmdr != self.cmdr or self.is_beta):
+            self.switch_cmdr(self.backfill.cmdr, False)
+        core = self.core
+        ledger = core.ledger
+        if ledger is None:
+            self.backfill.apply(core, self.backfill_entries)
+        else:
+            # The ledger already holds today's events from earlier runs and ignores any the backfill replays
+            # again, so it has the true totals for today once the backfilled events are written
+            self.backfill.apply(core, self.backfill_entries, restore_totals=False)
+            self.check_totals(core, ledger.today_later(self.backfill.cmdr), core.session_totals())
+        self.backfilled = True
+        self.backfill.save(core)  # From now on events are counted live
+        self.backfill_entries = None
+        self.backfill_thread = None
+
+    def check_totals(self, core, pending, counted):
+        """
+        Replace a commander's session totals with the ledger's once its writer has them, see check_backfill
+        :param pending: from Ledger.today_later
+        :param counted: the commander's totals when the ledger was asked, what is counted after is kept
+        """
+        try:
+            totals = pending.get_nowait()
+        except queue.Empty:
+            self.frame.after(self.BACKFILL_POLL_MS, self.check_totals, core, pending, counted)
+            return
+        if totals is not None:
+            live = core.session_totals()
+            core.set_session_totals({key: totals.get(key, 0) + value - counted[key] for key, value in live.items()})
 
     def setup_preferences(self, parent: nb.Notebook, cmdr: str, is_beta: bool) -> Optional[tk.Frame]:
         """
@@ -156,35 +390,55 @@ class RankProgress:
         :return: The frame to add to the settings window
         """
         """Plugin preferences setup hook."""
+        self.create_vars()
         frame = nb.Frame(parent)
         frame.columnconfigure(1, weight=1)
 
-        self.show_rank_button = nb.Checkbutton(
-            # LANG: Settings>EDSM - Label on checkbox for 'send data'
-            frame, text='Show Ranks', variable=self.show_rank,
-            command=self.on_check
-        )
-        self.show_rank_button.grid(columnspan=2, padx=12, pady=(5, 0), sticky=tk.W)
+        for name, _, text, padx in SHOW_SETTINGS:
+            button = nb.Checkbutton(frame, text=text, variable=self.show_vars[name], command=self.on_check)
+            button.grid(columnspan=2, padx=padx, pady=(5, 0), sticky=tk.W)
+            self.show_buttons[name] = button
 
-        self.show_rank_row_button = nb.Checkbutton(
-            # LANG: Settings>EDSM - Label on checkbox for 'send data'
-            frame, text='Use separate row for rank', variable=self.show_rank_row
+        self.cargo_fifo_button = nb.Checkbutton(
+            frame, text='Trade profit uses first in, first out cost (default is average cost)',
+            variable=self.cargo_fifo
         )
-        self.show_rank_row_button.grid(columnspan=2, padx=24, pady=(5, 0), sticky=tk.W)
+        self.cargo_fifo_button.grid(columnspan=2, padx=12, pady=(5, 0), sticky=tk.W)
 
-        self.show_combat_stats_button = nb.Checkbutton(
-            # LANG: Settings>EDSM - Label on checkbox for 'send data'
-            frame, text='Show Combat Stats', variable=self.show_combat_stats,
-            command=self.on_check
-        )
-        self.show_combat_stats_button.grid(columnspan=2, padx=12, pady=(5, 0), sticky=tk.W)
+        log_frame = nb.Frame(frame)
+        log_frame.grid(columnspan=2, padx=12, pady=(5, 0), sticky=tk.W)
+        nb.Label(log_frame, text='Log level').grid(row=0, column=0, sticky=tk.W)
+        nb.OptionMenu(log_frame, self.log_level, self.log_level.get(), *LOG_LEVELS).grid(row=0, column=1, sticky=tk.W)
 
-        self.show_trade_stats_button = nb.Checkbutton(
-            # LANG: Settings>EDSM - Label on checkbox for 'send data'
-            frame, text='Show Trade Stats', variable=self.show_trade_stats,
-            command=self.on_check
+        self.log_rate_limit_button = nb.Checkbutton(
+            frame, text='Limit repeated log messages', variable=self.log_rate_limit
         )
-        self.show_trade_stats_button.grid(columnspan=2, padx=12, pady=(5, 0), sticky=tk.W)
+        self.log_rate_limit_button.grid(columnspan=2, padx=12, pady=(5, 0), sticky=tk.W)
+
+        server_frame = nb.Frame(frame)
+        server_frame.grid(columnspan=2, padx=12, pady=(5, 0), sticky=tk.W)
+        nb.Checkbutton(
+            server_frame, text='Serve stats for overlays at http://127.0.0.1 port', variable=self.serve
+        ).grid(row=0, column=0, sticky=tk.W)
+        nb.Entry(server_frame, textvariable=self.serve_port, width=6).grid(row=0, column=1, sticky=tk.W)
+
+        nb.Checkbutton(
+            frame, text='Record journal events for replay (capture-*.edrp in the plugin folder)', variable=self.record
+        ).grid(columnspan=2, padx=12, pady=(5, 0), sticky=tk.W)
+
+        nb.Checkbutton(
+            frame, text='Collect performance statistics', variable=self.instrument
+        ).grid(columnspan=2, padx=12, pady=(5, 0), sticky=tk.W)
+        self.instrument_label = nb.Label(frame, text=self.instruments.summary(), justify=tk.LEFT)
+        self.instrument_label.grid(columnspan=2, padx=24, pady=(5, 0), sticky=tk.W)
+        buttons = nb.Frame(frame)
+        buttons.grid(columnspan=2, padx=24, pady=(5, 0), sticky=tk.W)
+        nb.Button(buttons, text='Refresh', command=self.on_instrument_refresh).grid(row=0, column=0, sticky=tk.W)
+        nb.Button(buttons, text='Export', command=self.on_instrument_export).grid(row=0, column=1, padx=(5, 0),
+                                                                                   sticky=tk.W)
+        nb.Button(buttons, text='Export session rewards', command=self.on_session_export).grid(row=0, column=2,
+                                                                                                padx=(5, 0),
+                                                                                                sticky=tk.W)
 
         label = nb.Label(frame, text=f"{PLUGIN_NAME} {VERSION}")
         label.grid(columnspan=2, padx=12, pady=(10, 0), sticky=tk.W)
@@ -193,12 +447,41 @@ class RankProgress:
 
         return frame
 
+    def on_instrument_refresh(self):
+        self.instrument_label["text"] = self.instruments.summary()
+
+    def on_instrument_export(self):
+        """
+        Save the statistics to instrumentation.json in our plugin directory
+        """
+        path = os.path.join(self.plugin_dir, "instrumentation.json")
+        try:
+            self.instruments.export(path)
+            self.instrument_label["text"] = f"{self.instruments.summary()}\nSaved to {path}"
+        except OSError as e:
+            LOG.log("Unable to export statistics: %s", "WARNING", e)
+            self.instrument_label["text"] = f"Unable to save {path}: {e}"
+
+    def on_session_export(self):
+        """
+        Save this session's reward events to session.csv and session.col in our plugin directory
+        """
+        base = os.path.join(self.plugin_dir, "session")
+        try:
+            self.core.analytics.save_csv(base + ".csv")
+            self.core.analytics.save_columns(base + ".col")
+            self.instrument_label["text"] = f"{self.instruments.summary()}\nSaved {len(self.core.analytics)} rewards " \
+                                            f"to {base}.csv and .col"
+        except OSError as e:
+            LOG.log("Unable to export the session: %s", "WARNING", e)
+            self.instrument_label["text"] = f"Unable to save {base}.csv: {e}"
+
     def on_check(self):
         # Toggle state of separate row checkbox
-        if self.show_rank.get() == 1:
-            self.show_rank_row_button["state"] = tk.NORMAL
+        if self.show_vars["rank"].get() == 1:
+            self.show_buttons["rank_row"]["state"] = tk.NORMAL
         else:
-            self.show_rank_row_button["state"] = tk.DISABLED
+            self.show_buttons["rank_row"]["state"] = tk.DISABLED
 
     def on_preferences_closed(self, cmdr: str, is_beta: bool) -> None:
         """
@@ -209,19 +492,40 @@ class RankProgress:
         :param cmdr: The current ED Commander
         :param is_beta: Whether or not EDMC is currently marked as in beta mode
         """
-        config.set('edrp_show_rank', self.show_rank.get())
-        self.show_rank_val = self.show_rank.get()
-        config.set('edrp_show_rank_row', self.show_rank_row.get())
-        self.show_rank_row_val = self.show_rank_row.get()
-
-        config.set('edrp_show_trade_stats', self.show_trade_stats.get())
-        self.show_trade_stats_val = self.show_trade_stats.get()
-        config.set('edrp_show_combat_stats', self.show_combat_stats.get())
-        self.show_combat_stats_val = self.show_combat_stats.get()
-
+        if not self.show_vars:  # The preferences were never opened so nothing can have changed
+            self.store.flush()
+            return
+        for name, key, _, _ in SHOW_SETTINGS:
+            self.shown[name] = self.show_vars[name].get()
+            self.store.set(key, self.shown[name])
+        self.store.set('edrp_cargo_fifo', self.cargo_fifo.get())
+        for core in self.profiles.profiles.values():
+            core.cargo.method = FIFO if self.cargo_fifo.get() else AVERAGE
+        self.store.set('edrp_log_level', self.log_level.get())
+        self.store.set('edrp_log_rate_limit', self.log_rate_limit.get())
+        self.store.set('edrp_instrument', self.instrument.get())
+        self.instruments.enabled = bool(self.instrument.get())
+        self.store.set('edrp_server', self.serve.get())
+        try:
+            port = int(self.serve_port.get())
+        except ValueError:
+            port = -1
+        if 0 <= port <= 65535:
+            self.store.set('edrp_server_port', port)
+        else:
+            self.serve_port.set(str(self.store.get_int('edrp_server_port', SERVER_PORT)))
+        self.setup_server()
+        self.store.set('edrp_capture', self.record.get())
+        self.setup_capture()
+        LOG.configure(level=self.log_level.get(), rate_limit=self.LOG_RATE_LIMIT if self.log_rate_limit.get() else 0)
+        self.store.flush()
+
+        if self.frame is None:
+            return
         self.setup_frame()
         self.update_stats()
         self.update_combat_stats()
+        self.schedule_rates()
 
     def setup_main_ui(self, parent: tk.Frame) -> tk.Frame:
         """
@@ -235,7 +539,12 @@ class RankProgress:
         if len(self.labels) == 0:  # Initialize the UI
             frame = tk.Frame(parent)
             self.frame = frame
+            self.store.schedule = frame.after  # Batch config writes on the Tk loop
+            self.snapshots.schedule = frame.after
+            self.renderer.attach(frame)
             self.setup_frame()
+            self.check_backfill()
+            self.schedule_rates()
 
         self.update_stats()
         self.update_combat_stats()
@@ -243,10 +552,38 @@ class RankProgress:
         return self.frame
 
     def setup_frame(self):
-        frame = self.frame
-        for widget in frame.winfo_children():
-            widget.destroy()
+        """
+        Show or hide the optional rows for the current settings.
 
+        The widgets are created once, on the first call, after that we only grid or grid_remove the rows
+        whose setting changed.
+        """
+        if len(self.labels) == 0:
+            self.build_frame()
+
+        show_rank_row = self.shown["rank_row"] == 1 and self.shown["rank"] == 1
+        show_combat = self.shown["combat_stats"] == 1
+        show_trade = self.shown["trade_stats"] == 1
+        show_lifetime = self.shown["lifetime"] == 1
+
+        self.show_row("rank", show_rank_row)
+        self.show_row("spacer", show_combat or show_trade or show_lifetime)
+        self.show_row("combat", show_combat)
+        self.show_row("trade", show_trade)
+        self.show_row("lifetime", show_lifetime)
+
+    def show_row(self, name, show):
+        if self.rows_shown.get(name) == show:
+            return
+        for widget in self.rows[name]:
+            if show:
+                widget.grid()  # Restores the grid options from build_frame
+            else:
+                widget.grid_remove()
+        self.rows_shown[name] = show
+
+    def build_frame(self):
+        frame = self.frame
         border = 0
 
         frame.grid(columnspan=2)  # Full width of EDMC
@@ -287,6 +624,8 @@ class RankProgress:
 
         self.labels["profit"] = (tk.Label(frame_p), )  # Trade Profit
         self.labels["exp_data"] = (tk.Label(frame_p), )  # Exploration Data
+        for key, _ in LIFETIME_LABELS:
+            self.labels[key] = (tk.Label(frame_p), )
 
         # Layout with 2 rows, one for Progress and one for Rank
         tk.Label(frame_h, text="Horizons", justify="center").grid(row=0, column=0, columnspan=2)  # Horizons Label
@@ -309,160 +648,130 @@ class RankProgress:
         tk.Label(frame_p, text="Federation:").grid(row=1, column=3, sticky=tk.W)  # Federation
         self.labels["fed"][0].grid(row=1, column=4, sticky=tk.W)
 
-        # Do we show the ranks?
-        if self.show_rank_row_val == 1 and self.show_rank_val == 1:
-            self.labels["com"][1].grid(row=2, column=0, columnspan=2)  # combat rank
-            self.labels["trd"][1].grid(row=4, column=0, columnspan=2)
-            self.labels["exp"][1].grid(row=6, column=0, columnspan=2)
-            self.labels["merc"][1].grid(row=2, column=0, columnspan=2)  # merc rank
-            self.labels["exo"][1].grid(row=4, column=0, columnspan=2)
-            self.labels["emp"][1].grid(row=2, column=0, columnspan=2)
-            self.labels["fed"][1].grid(row=2, column=3, columnspan=2)
-
-        # Do we show combat stats? or trade stats?
-        if self.show_combat_stats_val == 1 or self.show_trade_stats_val == 1:
-            tk.Label(frame_p, text="").grid(row=3, column=0)
-
-            if self.show_combat_stats_val == 1:
-                tk.Label(frame_p, text="Combat:").grid(row=4, column=0, sticky=tk.W)
-                tk.Label(frame_p, text="Bounties:").grid(row=4, column=1, columnspan=2, sticky=tk.W)  # Bounties
-                self.labels["bounty"][0].grid(row=4, column=3, sticky=tk.W)
-                self.labels["bounty"][1].grid(row=4, column=4, sticky=tk.W)
-                tk.Label(frame_p, text="Bonds:").grid(row=5, column=1, columnspan=2, sticky=tk.W)  # Bounties
-                self.labels["bond"][0].grid(row=5, column=3, sticky=tk.W)
-                self.labels["bond"][1].grid(row=5, column=4, sticky=tk.W)
-
-            if self.show_trade_stats_val == 1:
-                tk.Label(frame_p, text="Profit:").grid(row=6, column=0, sticky=tk.W)
-                self.labels["profit"][0].grid(row=6, column=1, sticky=tk.W)
-                tk.Label(frame_p, text="Exp Data").grid(row=6, column=3, sticky=tk.W)
-                self.labels["exp_data"][0].grid(row=6, column=4, sticky=tk.W)
-
+        # Optional rows, each is gridded once here and then hidden or shown by setup_frame
+        self.labels["com"][1].grid(row=2, column=0, columnspan=2)  # combat rank
+        self.labels["trd"][1].grid(row=4, column=0, columnspan=2)
+        self.labels["exp"][1].grid(row=6, column=0, columnspan=2)
+        self.labels["merc"][1].grid(row=2, column=0, columnspan=2)  # merc rank
+        self.labels["exo"][1].grid(row=4, column=0, columnspan=2)
+        self.labels["emp"][1].grid(row=2, column=0, columnspan=2)
+        self.labels["fed"][1].grid(row=2, column=3, columnspan=2)
+        rank = [self.labels[key][1] for key in ("com", "trd", "exp", "merc", "exo", "emp", "fed")]
+
+        spacer = tk.Label(frame_p, text="")
+        spacer.grid(row=3, column=0)
+
+        combat = [tk.Label(frame_p, text="Combat:"), tk.Label(frame_p, text="Bounties:"),
+                  tk.Label(frame_p, text="Bonds:")]
+        combat[0].grid(row=4, column=0, sticky=tk.W)
+        combat[1].grid(row=4, column=1, columnspan=2, sticky=tk.W)  # Bounties
+        self.labels["bounty"][0].grid(row=4, column=3, sticky=tk.W)
+        self.labels["bounty"][1].grid(row=4, column=4, sticky=tk.W)
+        combat[2].grid(row=5, column=1, columnspan=2, sticky=tk.W)  # Bonds
+        self.labels["bond"][0].grid(row=5, column=3, sticky=tk.W)
+        self.labels["bond"][1].grid(row=5, column=4, sticky=tk.W)
+        combat += list(self.labels["bounty"]) + list(self.labels["bond"])
+
+        trade = [tk.Label(frame_p, text="Profit:"), tk.Label(frame_p, text="Exp Data")]
+        trade[0].grid(row=6, column=0, sticky=tk.W)
+        self.labels["profit"][0].grid(row=6, column=1, sticky=tk.W)
+        trade[1].grid(row=6, column=3, sticky=tk.W)
+        self.labels["exp_data"][0].grid(row=6, column=4, sticky=tk.W)
+        trade += [self.labels["profit"][0], self.labels["exp_data"][0]]
+
+        lifetime = [tk.Label(frame_p, text="Lifetime", justify="center"), tk.Label(frame_p, text="Bounties:"),
+                    tk.Label(frame_p, text="Bonds:"), tk.Label(frame_p, text="Profit:"),
+                    tk.Label(frame_p, text="Exp Data"), tk.Label(frame_p, text="Exobiology:")]
+        lifetime[0].grid(row=7, column=0, columnspan=5, sticky=tk.W + tk.E)
+        for label, (key, _), (row, column) in zip(lifetime[1:], LIFETIME_LABELS, ((8, 0), (8, 3), (9, 0), (9, 3),
+                                                                                   (10, 0))):
+            label.grid(row=row, column=column, sticky=tk.W)
+            self.labels[key][0].grid(row=row, column=column + 1, sticky=tk.W)
+            lifetime.append(self.labels[key][0])
+
+        self.rows = {"rank": rank, "spacer": [spacer], "combat": combat, "trade": trade, "lifetime": lifetime}
+        self.rows_shown = dict()  # Unknown, so the first setup_frame sets them all
+
+        # Theme only needs applying to the widgets once, when they are created
         for widget in frame.winfo_children():
             theme.update(widget)
 
-    def update_stats(self):
+    def schedule_rates(self):
         """
-        Update our data on the UI
-        :return: Nothing
+        Start redrawing the rates periodically, if they are shown and not already being redrawn
         """
+        if self.rates_timer is None and self.shown["rates"] == 1:
+            self.rates_timer = self.frame.after(self.RATES_REFRESH_MS, self.refresh_rates)
 
-        LOG.log("Update UI", "DEBUG")
-
-        if self.show_rank_row_val == 0 and self.show_rank_val == 1:
-            self.labels["com"][0]["text"] = f"{combat_ranks[self.combat_rank]}  {self.combat}%"
-            self.labels["trd"][0]["text"] = f"{trade_ranks[self.trade_rank]}  {self.trade}%"
-            self.labels["exp"][0]["text"] = f"{explore_ranks[self.explore_rank]}  {self.explore}%"
-
-            self.labels["merc"][0]["text"] = f"{soldier_ranks[self.soldier_rank]}  {self.soldier}%"
-            self.labels["exo"][0]["text"] = f"{exobiologist_ranks[self.exobiologist_rank]}  {self.exobiologist}%"
-
-            self.labels["emp"][0]["text"] = f"{empire_ranks[self.empire_rank]}  {self.empire}%"
-            self.labels["fed"][0]["text"] = f"{federation_ranks[self.federation_rank]}  {self.federation}%"
-
-        else:
-            self.labels["com"][0]["text"] = f"{self.combat}%"
-            self.labels["trd"][0]["text"] = f"{self.trade}%"
-            self.labels["exp"][0]["text"] = f"{self.explore}%"
-            self.labels["com"][1]["text"] = f"{combat_ranks[self.combat_rank]}"
-            self.labels["trd"][1]["text"] = f"{trade_ranks[self.trade_rank]}"
-            self.labels["exp"][1]["text"] = f"{explore_ranks[self.explore_rank]}"
-
-            self.labels["merc"][0]["text"] = f"{self.soldier}%"
-            self.labels["exo"][0]["text"] = f"{self.exobiologist}%"
-            self.labels["merc"][1]["text"] = f"{soldier_ranks[self.soldier_rank]}"
-            self.labels["exo"][1]["text"] = f"{exobiologist_ranks[self.exobiologist_rank]}"
-
-            self.labels["emp"][0]["text"] = f"{self.empire}%"
-            self.labels["fed"][0]["text"] = f"{self.federation}%"
-            self.labels["emp"][1]["text"] = f"{empire_ranks[self.empire_rank]}"
-            self.labels["fed"][1]["text"] = f"{federation_ranks[self.federation_rank]}"
-
-    def update_progress(self, entry):
-        """
-        Update our stats from the log entry
-        :param entry: the log entry as a dictionary
-        :return: nothing
-        """
-        if "Combat" in entry:
-            self.combat = entry["Combat"]
-            self.trade = entry["Trade"]
-            self.explore = entry["Explore"]
-            self.empire = entry["Empire"]
-            self.federation = entry["Federation"]
-        if "Soldier" in entry:
-            self.soldier = entry["Soldier"]
-            self.exobiologist = entry["Exobiologist"]
-
-        self.log_data()
+    def refresh_rates(self):
+        self.rates_timer = None
+        if self.shown["rates"] == 1:  # Otherwise the rates were turned off, let the timer stop
+            self.update_stats()
+            self.update_combat_stats()
+            self.schedule_rates()
 
-        config.set("edrp_last_combat", self.combat)
-        config.set("edrp_last_trade", self.trade)
-        config.set("edrp_last_explore", self.explore)
-        config.set("edrp_last_soldier", self.soldier)
-        config.set("edrp_last_exobiologist", self.exobiologist)
-        config.set("edrp_last_empire", self.empire)
-        config.set("edrp_last_federation", self.federation)
-
-        self.update_stats()
-
-    def update_ranks(self, entry):
+    def update_stats(self):
         """
-        Update our stats from the log entry
-        :param entry: the log entry as a dictionary
-        :return: nothing
+        Ask for our data to be redrawn on the UI, bursts of updates are drawn once when Tk is next idle
+        :return: Nothing
         """
-        if "Combat" in entry:
-            self.combat_rank = entry["Combat"]
-            self.trade_rank = entry["Trade"]
-            self.explore_rank = entry["Explore"]
-            self.empire_rank = entry["Empire"]
-            self.federation_rank = entry["Federation"]
-        if "Soldier" in entry:
-            self.soldier_rank = entry["Soldier"]
-            self.exobiologist_rank = entry["Exobiologist"]
-
-        self.log_data()
-
-        config.set("edrp_last_combat_rank", self.combat_rank)
-        config.set("edrp_last_trade_rank", self.trade_rank)
-        config.set("edrp_last_explore_rank", self.explore_rank)
-        config.set("edrp_last_soldier_rank", self.soldier_rank)
-        config.set("edrp_last_exobiologist_rank", self.exobiologist_rank)
-        config.set("edrp_last_empire_rank", self.empire_rank)
-        config.set("edrp_last_federation_rank", self.federation_rank)
-
-        self.update_stats()
-
-    def update_bounty(self, event):
-        self.bounties += 1
-        self.bounties_value += event["TotalReward"]
-        self.update_combat_stats()
-
-    def update_bond(self, event):
-        self.bonds_value += event["Reward"]
-        self.bonds += 1
-        self.update_combat_stats()
+        self.renderer.request()
 
     def update_combat_stats(self):
-        self.labels["bounty"][0]["text"] = f"{self.bounties}"
-        self.labels["bounty"][1]["text"] = "{:,.0f}Kcr".format(self.bounties_value/1000)
-        self.labels["bond"][0]["text"] = f"{self.bonds}"
-        self.labels["bond"][1]["text"] = "{:,.0f}Kcr".format(self.bonds_value/1000)
+        self.renderer.request()
 
-        self.labels["profit"][0]["text"] = "{:,.0f}Kcr".format(self.trade_profit/1000)
-        self.labels["exp_data"][0]["text"] = "{:,.0f}Kcr".format(self.explore_profit/1000)
+    # RankView, called by the core when its data changes
+    stats_changed = update_stats
+    combat_stats_changed = update_combat_stats
 
-    def update_market(self, event,  is_buy=False):
-        if is_buy:
-            pass  # nothing for now
-        else:
-            self.trade_profit += event["Count"] * (event["SellPrice"] - event["AvgPricePaid"])
-        self.update_combat_stats()
+    def draw(self):
+        LOG.log("Update UI", "DEBUG")
+        self.draw_stats()
+        self.draw_combat_stats()
+        if self.server is not None:
+            self.server.publish(self.core.state())
 
-    def update_exp_data(self, event):
-        self.explore_profit += event["TotalEarnings"]
-        self.update_combat_stats()
+    def draw_stats(self):
+        """
+        Update our rank data on the UI, only labels whose text changed are touched
+        :return: Nothing
+        """
+        set_text = self.renderer.set_text
+        core = self.core
+        labels = self.labels
+        inline = self.shown["rank_row"] == 0 and self.shown["rank"] == 1
+        rates = core.rates if self.shown["rates"] == 1 else None
+        estimates = self.shown["estimates"] == 1
+        tracks = core.tracks
+        for key, track in PROGRESS_LABELS:
+            pct = tracks.pct(track)
+            rank = RANK_NAMES[track][tracks.rank(track)]
+            estimate = core.estimate(track) if estimates else None
+            if estimate is not None:
+                text = f"{rank}  {estimate_text(estimate)}" if inline else estimate_text(estimate)
+            else:
+                text = rank_pct_text(rank, pct) if inline else pct_text(pct)
+            if rates is not None:
+                text += rate_text(rates.pct_per_hour(track), rates.eta_hours(track, pct))
+            set_text(labels[key][0], text)
+            if not inline:
+                set_text(labels[key][1], rank)
+
+    def draw_combat_stats(self):
+        set_text = self.renderer.set_text
+        core = self.core
+        rates = core.rates if self.shown["rates"] == 1 else None
+        set_text(self.labels["bounty"][0], f"{core.bounties}")
+        set_text(self.labels["bond"][0], f"{core.bonds}")
+        for key, attr in CREDIT_LABELS:
+            text = kcr_text(getattr(core, attr))
+            if rates is not None:
+                text += kcr_rate_text(rates.credits_per_hour(attr))
+            set_text(self.labels[key][-1], text)
+        if self.shown["lifetime"] == 1:
+            lifetime = core.lifetime_totals()
+            for key, total in LIFETIME_LABELS:
+                set_text(self.labels[key][0], kcr_text(lifetime[total]) if lifetime else "-")
 
 
 plug = RankProgress()
@@ -471,7 +780,7 @@ plug = RankProgress()
 # Note that all of these could be simply replaced with something like:
 # plugin_start3 = cc.on_load
 def plugin_start3(plugin_dir: str) -> str:
-    return plug.on_load()
+    return plug.on_load(plugin_dir)
 
 
 def plugin_stop() -> None:
@@ -491,27 +800,4 @@ def plugin_app(parent: tk.Frame) -> Optional[tk.Frame]:
 
 
 def journal_entry(cmdr, is_beta, system, station, entry, state):
-    if entry["event"] == "Progress":
-        LOG.log(f"Progress Event {entry}", "DEBUG")
-        plug.update_progress(entry)
-    elif entry["event"] == "Rank":
-        LOG.log(f"Rank event {entry}", "DEBUG")
-        plug.update_ranks(entry)
-    elif entry["event"] == "Bounty":
-        LOG.log(f"Bounty event {entry}", "DEBUG")
-        plug.update_bounty(entry)
-    elif entry["event"] == "FactionKillBond":
-        LOG.log(f"Bond event {entry}", "DEBUG")
-        plug.update_bond(entry)
-    elif entry["event"] == "MarketBuy":
-        LOG.log(f"Market Buy {entry}", "DEBUG")
-        plug.update_market(entry, True)
-    elif entry["event"] == "MarketSell":
-        LOG.log(f"Market Sell {entry}", "INFO")
-        plug.update_market(entry, False)
-    elif entry["event"] == "SellExplorationData":
-        LOG.log(f"Exploration sell {entry}", "INFO")
-        plug.update_exp_data(entry)
-    elif entry["event"] == "MultiSellExplorationData":
-        LOG.log(f"Exploration sell {entry}", "INFO")
-        plug.update_exp_data(entry)
+    plug.journal_entry(cmdr, is_beta, system, station, entry, state)
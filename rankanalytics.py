@@ -0,0 +1,332 @@
+"""
+Columnar session analytics for the reward events RankCore counts.
+
+SessionColumns keeps every bounty, bond, trade and exploration sale in typed, growable columns (array.array):
+timestamp, kind, value and a place id (the paying faction for bounties and bonds, otherwise the star system)
+into a table of names.  With NumPy installed the analyses run as vectorised operations over zero copy views
+of the columns, without it the same results come from plain Python loops.
+
+Sessions can be exported to CSV or to a compact binary file with the raw columns, see save_columns.  Run as a
+command line tool it builds the columns from the journals on disk:
+
+    python rankanalytics.py JOURNAL_DIR --cmdr Jameson --csv session.csv --columns session.col
+"""
+import argparse
+import csv
+import json
+import os
+import struct
+import sys
+from array import array
+from datetime import datetime, timezone
+
+from rankjournals import commander_name, event_name, journal_files, parse, read_lines
+from rankcore import EVENT_HANDLERS, headless_core
+
+numpy = False  # Not imported yet, see use_numpy
+
+KINDS = ("bounty", "bond", "trade", "exploration")
+KIND_CODES = {kind: code for code, kind in enumerate(KINDS)}
+SESSION_GAP = 30 * 60  # seconds without a reward that end a session
+HOUR = 3600
+
+COLUMNS_MAGIC = b"EDRPCOL1"
+COLUMN_TYPES = (("ts", "d"), ("kind", "B"), ("value", "q"), ("place", "I"))  # name and array typecode
+
+
+def use_numpy():
+    """
+    NumPy, imported the first time an analysis runs rather than slowing down the plugin's startup
+    :return: the numpy module, None if it isn't installed (the plugin and this tool work without it, only slower)
+    """
+    global numpy
+    if numpy is False:
+        try:
+            import numpy
+        except ImportError:
+            numpy = None
+    return numpy
+
+
+def place_of(kind, entry, system):
+    """
+    Who paid for a reward: the faction for bounties and bonds, otherwise the system it was earned in
+    """
+    if kind == "bounty":
+        rewards = entry.get("Rewards")
+        if rewards:
+            return rewards[0].get("Faction") or system
+        return entry.get("Faction") or system
+    if kind == "bond":
+        return entry.get("AwardingFaction") or system
+    return system
+
+
+class SessionColumns(object):
+    """
+    Growable typed columns of reward events, oldest first
+    """
+
+    def __init__(self):
+        self.ts = array("d")
+        self.kind = array("B")
+        self.value = array("q")
+        self.place = array("I")
+        self.places = []  # place id -> name
+        self.place_ids = dict()  # name -> place id
+
+    def __len__(self):
+        return len(self.ts)
+
+    def add(self, t, kind, value, place=None):
+        """
+        :param t: unix timestamp
+        :param kind: one of KINDS
+        :param place: faction or system name, None if unknown
+        """
+        place_id = self.place_ids.get(place)
+        if place_id is None:
+            place_id = self.place_ids[place] = len(self.places)
+            self.places.append(place)
+        self.ts.append(t)
+        self.kind.append(KIND_CODES[kind])
+        self.value.append(value)
+        self.place.append(place_id)
+
+    def record(self, t, kind, value, entry, system=None):
+        """
+        Add a reward event RankCore counted
+        """
+        self.add(t, kind, value, place_of(kind, entry, system))
+
+    def rows(self):
+        """
+        :return: generator of (timestamp, kind, value, place name)
+        """
+        places = self.places
+        for t, kind, value, place in zip(self.ts, self.kind, self.value, self.place):
+            yield t, KINDS[kind], value, places[place]
+
+    def views(self, kind=None):
+        """
+        NumPy views of the ts and value columns, only the rows of one kind if given
+        """
+        np = use_numpy()
+        ts = np.frombuffer(self.ts, dtype=np.float64)
+        value = np.frombuffer(self.value, dtype=np.int64)
+        if kind is None:
+            return ts, value
+        mask = np.frombuffer(self.kind, dtype=np.uint8) == KIND_CODES[kind]
+        return ts[mask], value[mask]
+
+    def selected(self, kind=None):
+        """
+        The ts and value columns as lists, only the rows of one kind if given
+        """
+        if kind is None:
+            return list(self.ts), list(self.value)
+        code = KIND_CODES[kind]
+        rows = [(t, v) for t, k, v in zip(self.ts, self.kind, self.value) if k == code]
+        return [t for t, _ in rows], [v for _, v in rows]
+
+    def hourly(self, kind=None):
+        """
+        Histogram by hour since the first event
+        :return: list of (hour start timestamp, number of events, total value)
+        """
+        if not len(self):
+            return []
+        start = min(self.ts)
+        np = use_numpy()
+        if np is not None:
+            ts, value = self.views(kind)
+            bins = ((ts - start) // HOUR).astype(np.int64)
+            counts = np.bincount(bins)
+            totals = np.bincount(bins, weights=value)
+            return [(start + hour * HOUR, int(counts[hour]), int(totals[hour])) for hour in range(len(counts))]
+        ts, value = self.selected(kind)
+        hours = dict()
+        for t, v in zip(ts, value):
+            bucket = hours.setdefault(int((t - start) // HOUR), [0, 0])
+            bucket[0] += 1
+            bucket[1] += v
+        last = max(hours) + 1 if hours else 0
+        return [(start + hour * HOUR, *hours.get(hour, (0, 0))) for hour in range(last)]
+
+    def moving_average(self, window=HOUR, kind=None):
+        """
+        Credits per hour over the window ending at each event
+        :return: list of (timestamp, credits per hour)
+        """
+        np = use_numpy()
+        if np is not None:
+            ts, value = self.views(kind)
+            if not len(ts):
+                return []
+            sums = np.concatenate(([0], np.cumsum(value)))
+            first = np.searchsorted(ts, ts - window, side="right")
+            rates = (sums[1:] - sums[first]) * (HOUR / window)
+            return list(zip(ts.tolist(), rates.tolist()))
+        ts, value = self.selected(kind)
+        result = []
+        first = 0
+        total = 0
+        for t, v in zip(ts, value):
+            total += v
+            while ts[first] <= t - window:
+                total -= value[first]
+                first += 1
+            result.append((t, total * HOUR / window))
+        return result
+
+    def sessions(self, gap=SESSION_GAP):
+        """
+        Split the events into sessions at gaps of more than gap seconds
+        :return: list of dicts with start, end, events, value and credits per hour (a session shorter than an hour
+            counts as an hour)
+        """
+        if not len(self):
+            return []
+        np = use_numpy()
+        if np is not None:
+            ts, value = self.views()
+            starts = np.concatenate(([0], np.nonzero(np.diff(ts) > gap)[0] + 1))
+            ends = np.concatenate((starts[1:], [len(ts)])) - 1
+            values = np.add.reduceat(value, starts)
+            bounds = zip(ts[starts].tolist(), ts[ends].tolist(), (ends - starts + 1).tolist(), values.tolist())
+        else:
+            bounds = []
+            begin = 0
+            for i in range(1, len(self.ts) + 1):
+                if i == len(self.ts) or self.ts[i] - self.ts[i - 1] > gap:
+                    bounds.append((self.ts[begin], self.ts[i - 1], i - begin, sum(self.value[begin:i])))
+                    begin = i
+        return [{"start": start, "end": end, "events": events, "value": total,
+                 "per_hour": total * HOUR / max(end - start, HOUR)}
+                for start, end, events, total in bounds]
+
+    def best_session(self, gap=SESSION_GAP):
+        """
+        The session that earned the most credits per hour, None if there are no events
+        """
+        return max(self.sessions(gap), key=lambda session: session["per_hour"], default=None)
+
+    def place_totals(self, kind="bond"):
+        """
+        Total value by faction (or system) for one kind of reward, largest first
+        :return: list of (place name, total value)
+        """
+        np = use_numpy()
+        if np is not None:
+            mask = np.frombuffer(self.kind, dtype=np.uint8) == KIND_CODES[kind]
+            place = np.frombuffer(self.place, dtype=np.uint32)
+            totals = np.bincount(place[mask], weights=np.frombuffer(self.value, dtype=np.int64)[mask],
+                                    minlength=len(self.places))
+            totals = [(self.places[i], int(total)) for i, total in enumerate(totals.tolist()) if total]
+        else:
+            sums = dict()
+            code = KIND_CODES[kind]
+            for k, v, p in zip(self.kind, self.value, self.place):
+                if k == code:
+                    sums[p] = sums.get(p, 0) + v
+            totals = [(self.places[p], total) for p, total in sums.items()]
+        return sorted(totals, key=lambda item: item[1], reverse=True)
+
+    def save_csv(self, path):
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(("timestamp", "kind", "value", "place"))
+            for t, kind, value, place in self.rows():
+                writer.writerow((datetime.fromtimestamp(t, timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"), kind, value,
+                                 place or ""))
+
+    def save_columns(self, path):
+        """
+        Write the binary columnar file: COLUMNS_MAGIC, the row count (uint64), each column's raw little endian
+        values in COLUMN_TYPES order, then the place names as a length prefixed JSON list
+        """
+        names = json.dumps(self.places, separators=(",", ":")).encode("utf-8")
+        with open(path, "wb") as f:
+            f.write(COLUMNS_MAGIC)
+            f.write(struct.pack("<Q", len(self)))
+            for name, _ in COLUMN_TYPES:
+                column = getattr(self, name)
+                if sys.byteorder == "big":
+                    column = array(column.typecode, column)
+                    column.byteswap()
+                f.write(column.tobytes())
+            f.write(struct.pack("<Q", len(names)))
+            f.write(names)
+
+    @classmethod
+    def load_columns(cls, path):
+        """
+        Read a file written by save_columns
+        """
+        columns = cls()
+        with open(path, "rb") as f:
+            if f.read(len(COLUMNS_MAGIC)) != COLUMNS_MAGIC:
+                raise ValueError(f"{path} is not a columns file")
+            count, = struct.unpack("<Q", f.read(8))
+            for name, typecode in COLUMN_TYPES:
+                column = array(typecode)
+                column.frombytes(f.read(count * column.itemsize))
+                if sys.byteorder == "big":
+                    column.byteswap()
+                setattr(columns, name, column)
+            size, = struct.unpack("<Q", f.read(8))
+            columns.places = json.loads(f.read(size))
+        columns.place_ids = {name: i for i, name in enumerate(columns.places)}
+        return columns
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Reward analytics from the journal archive")
+    parser.add_argument("journal_dir", help="the game's journal directory")
+    parser.add_argument("--cmdr", default=None, help="only this commander's journals")
+    parser.add_argument("--csv", default=None, help="export the events to this CSV file")
+    parser.add_argument("--columns", default=None, help="export the events to this binary columns file")
+    args = parser.parse_args(argv)
+
+    handled = frozenset(name.encode() for name in EVENT_HANDLERS) | {b"Location", b"FSDJump", b"CarrierJump"}
+    core = headless_core()
+    core.analytics = SessionColumns()
+    for f in journal_files(args.journal_dir):
+        cmdr = system = None
+        for _, line in read_lines(f.path):
+            name = event_name(line)
+            if name in (b"Commander", b"LoadGame"):
+                cmdr = commander_name(line) or cmdr
+                continue
+            if name not in handled:
+                continue
+            entry = parse(line)
+            if not entry:
+                continue
+            event = entry.get("event")
+            if event in ("Location", "FSDJump", "CarrierJump"):
+                system = entry.get("StarSystem") or system
+            elif args.cmdr is None or cmdr == args.cmdr:
+                core.journal_entry(cmdr, False, system, None, entry, None)
+
+    columns = core.analytics
+    print(f"{len(columns):,} reward events in {os.path.abspath(args.journal_dir)}"
+          f"{'' if use_numpy() is not None else ' (NumPy not installed)'}")
+    best = columns.best_session()
+    if best is not None:
+        print("Best session {} for {:.1f}h: {:,} events, {:,}cr, {:,.0f}cr/h".format(
+            datetime.fromtimestamp(best["start"], timezone.utc).strftime("%Y-%m-%d %H:%M"),
+            (best["end"] - best["start"]) / HOUR, best["events"], best["value"], best["per_hour"]))
+    for place, total in columns.place_totals("bond")[:10]:
+        print(f"  Bonds from {place or '(unknown)'}: {total:,}cr")
+    for place, total in columns.place_totals("bounty")[:10]:
+        print(f"  Bounties from {place or '(unknown)'}: {total:,}cr")
+    if args.csv:
+        columns.save_csv(args.csv)
+    if args.columns:
+        columns.save_columns(args.columns)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,236 @@
+"""
+Backfill of rank, progress and today's session totals from the journal files already on disk.
+
+Without this the plugin shows 0% and empty session stats until the game sends new events.  Backfill streams
+the journal files line by line, newest first, picks up the latest Rank and Progress and today's reward events
+and replays them through RankCore.journal_entry, the same handlers EDMC's events go through.
+
+A checkpoint file records the byte offset read in each journal, so later startups only read the bytes the
+game has written since.  Each commander's session totals, and the state of their cargo and progress estimator,
+are saved in the checkpoint together with the offsets they cover, so a restart carries them over without
+counting anything twice.  The checkpoint is a crash safe snapshot file (see ranksnapshot.py) and is saved during
+the session as well as at shutdown, so after a crash only the few bytes written since the last save need reading.
+"""
+import json
+import os
+import time
+from datetime import datetime, timezone
+
+from rankjournals import commander_name, event_name, journal_files, parse, read_lines
+from rankcore import REWARD_EVENTS
+from ranklogger import RankLogger
+from ranksnapshot import SnapshotWriter, read_snapshot, write_snapshot
+
+LOG = RankLogger()
+
+RANK_EVENTS = (b"Rank", b"Progress")
+REWARD_EVENT_NAMES = frozenset(name.encode() for name in REWARD_EVENTS)
+COMMANDER_EVENTS = (b"Commander", b"LoadGame")
+
+
+def utc_today():
+    return datetime.now(timezone.utc).date().isoformat()
+
+
+class Backfill(object):
+    """
+    Incremental journal reader that restores a RankCore's state at startup
+    """
+    CHECKPOINT_VERSION = 1
+
+    def __init__(self, journal_dir, checkpoint_path, legacy_path=None, background=False):
+        """
+        :param journal_dir: the game's journal directory
+        :param checkpoint_path: where to keep our checkpoint file
+        :param legacy_path: a JSON checkpoint from an older version, read if there is no checkpoint yet
+        :param background: write the checkpoint on a background thread, see close
+        """
+        self.writer = SnapshotWriter(checkpoint_path) if background else None
+        self.journal_dir = journal_dir
+        self.checkpoint_path = checkpoint_path
+        self.legacy_path = legacy_path
+        self.live = None  # The newest journal at the last save, older ones no longer change
+        self.rescan = True  # Look for newer journals than live at the next save
+        self.checkpoint = self.load_checkpoint()
+        self.cmdr = self.checkpoint.get("cmdr")
+        self.kept = set()  # Commanders kept since we started, what the checkpoint has for them is up to date
+        self.today = utc_today()
+
+    def load_checkpoint(self):
+        checkpoint = read_snapshot(self.checkpoint_path)
+        if checkpoint is None and self.legacy_path is not None:
+            try:
+                with open(self.legacy_path, encoding="utf-8") as f:
+                    checkpoint = json.load(f)
+            except (OSError, ValueError):
+                pass
+        if not isinstance(checkpoint, dict) or checkpoint.get("version") != self.CHECKPOINT_VERSION:
+            return {"version": self.CHECKPOINT_VERSION, "files": {}, "profiles": {}}
+        if "profiles" not in checkpoint:  # Saved before it was kept per commander
+            saved = {key: checkpoint.pop(key) for key in ("day", "totals", "state") if key in checkpoint}
+            checkpoint["profiles"] = {checkpoint["cmdr"]: saved} if saved and checkpoint.get("cmdr") else {}
+        return checkpoint
+
+    def scan(self, cmdr=None):
+        """
+        Read the new bytes in the journals.  This does not touch the RankCore, so it can run on a worker thread.
+
+        Files are read newest first.  Once the latest Rank and Progress have been found, files last written
+        before today are superseded and are just marked as read.
+
+        :param cmdr: only use journals for this commander, by default the commander in the newest journal
+        :return: the entries to replay, oldest first
+        """
+        self.today = utc_today()
+        today_start = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0).timestamp()
+        offsets = self.checkpoint["files"]
+        target = cmdr
+        latest = dict()
+        rewards = []
+        today = self.today.encode()
+        started = time.perf_counter()
+        read = 0
+
+        for f in reversed(journal_files(self.journal_dir)):
+            offset, file_cmdr = offsets.get(f.name, (0, None))
+            if target is None:
+                target = file_cmdr  # The newest journal decides the commander
+            stat = f.stat()
+            if stat.st_size <= offset:
+                continue
+            if len(latest) == len(RANK_EVENTS) and stat.st_mtime < today_start:
+                offsets[f.name] = [stat.st_size, file_cmdr]
+                continue
+
+            file_latest = dict()
+            file_rewards = []
+            for end, line in read_lines(f.path, offset):
+                name = event_name(line)
+                if name in REWARD_EVENT_NAMES:
+                    if line.find(today) >= 0:  # Cheap test before decoding, the timestamp is first
+                        entry = parse(line)
+                        if entry and entry.get("timestamp", "")[:10] == self.today:
+                            file_rewards.append(entry)
+                elif name in RANK_EVENTS:
+                    entry = parse(line)
+                    if entry:
+                        file_latest[name] = entry
+                elif name in COMMANDER_EVENTS:
+                    file_cmdr = commander_name(line) or file_cmdr
+                read += end - offset
+                offset = end
+            offsets[f.name] = [offset, file_cmdr]
+
+            if target is None:
+                target = file_cmdr
+            if target and file_cmdr and file_cmdr != target:
+                continue  # Another commander's journal
+            for name, entry in file_latest.items():
+                latest.setdefault(name, entry)  # Newer files were read first
+            rewards[:0] = file_rewards
+
+        self.cmdr = target
+        LOG.log("Backfill read %d bytes in %.3fs", "INFO", read, time.perf_counter() - started)
+        return [latest[name] for name in RANK_EVENTS if name in latest] + rewards
+
+    def saved_profile(self, cmdr):
+        """
+        What was saved for a commander, see save
+        """
+        return self.checkpoint["profiles"].get(cmdr, {})
+
+    def restore(self, core, cmdr, restore_totals=True):
+        """
+        Restore the state saved for a commander into a new RankCore
+        :param restore_totals: add the session totals saved in the checkpoint, if they are from today
+        """
+        saved = self.saved_profile(cmdr)
+        if "state" in saved:
+            core.restore(saved["state"])
+        if restore_totals and saved.get("day") == self.today and "totals" in saved:
+            core.add_session_totals(saved["totals"])
+
+    def apply(self, core, entries, restore_totals=True):
+        """
+        Replay the entries from scan into a RankCore, on the thread that owns it
+        :param restore_totals: add the session totals saved in the checkpoint, if they are from today
+        """
+        self.restore(core, self.cmdr, restore_totals)
+        for entry in entries:
+            core.journal_entry(self.cmdr, False, None, None, entry, None)
+
+    def run(self, core, cmdr=None):
+        """
+        Scan and apply in one go
+        """
+        self.apply(core, self.scan(cmdr))
+
+    def keep(self, core, cmdr):
+        """
+        Put a commander's state in the checkpoint, e.g. when switching away from them, the next save writes it
+        """
+        self.checkpoint["profiles"][cmdr] = {"day": utc_today(), "totals": core.session_totals(),
+                                             "state": core.snapshot()}
+        self.kept.add(cmdr)
+
+    def new_journal(self):
+        """
+        The game has started a new journal, e.g. on a Fileheader event, the next save looks for it
+        """
+        self.rescan = True
+
+    def save(self, core, cmdr=None):
+        """
+        Save the checkpoint, call this once the backfill has been applied, from time to time and at shutdown.
+
+        Every journal is marked as read up to its current size, the events in them have either been backfilled
+        or seen live, and the session totals and core state are saved to carry over to a restart later today.
+        Only the newest journal at the last save is looked at, the older ones are finished, unless the game
+        may have started a new one since: see new_journal, or the newest one has stopped growing.
+
+        :param core: the active commander's RankCore, the one the live events have been going to, None to only
+            mark the journals read
+        :param cmdr: the active commander, by default the one backfilled.  Other commanders keep what was saved
+            for them when they were last active
+        """
+        if cmdr is not None:
+            self.cmdr = cmdr
+        offsets = self.checkpoint["files"]
+        size = None
+        if self.live is None:
+            self.rescan = True  # No journals yet
+        elif not self.rescan:
+            try:
+                size = os.stat(os.path.join(self.journal_dir, self.live)).st_size
+            except OSError:
+                pass
+            # Events counted while the newest journal did not grow came from a newer one
+            self.rescan = size is None or size == offsets[self.live][0]
+        if self.rescan:
+            for f in journal_files(self.journal_dir, since=self.live):
+                previous = offsets.get(f.name, (0, None))
+                offsets[f.name] = [f.stat().st_size, previous[1]]
+                self.live = f.name
+            self.rescan = False
+        else:
+            offsets[self.live] = [size, offsets[self.live][1]]
+        if core is not None and self.cmdr is not None:
+            self.keep(core, self.cmdr)
+        self.checkpoint["cmdr"] = self.cmdr
+
+        if self.writer is not None:
+            # Copies of what save and keep change, the writer encodes the rest as it is
+            checkpoint = self.checkpoint
+            self.writer.write(dict(checkpoint, files=dict(checkpoint["files"]), profiles=dict(checkpoint["profiles"])))
+            return
+        try:
+            write_snapshot(self.checkpoint_path, self.checkpoint)
+        except OSError as e:
+            LOG.log("Unable to save backfill checkpoint: %s", "WARNING", e)
+
+    def close(self):
+        """
+        Finish writing the checkpoint, if it is written in the background
+        """
+        if self.writer is not None:
+            self.writer.close()
@@ -0,0 +1,205 @@
+"""
+Replay benchmark for the journal event pipeline.
+
+Replays a synthetic event stream, recorded Journal.*.log files or plugin captures (see rankcapture.py) through
+RankCore.journal_entry (the code EDMC's journal_entry hook calls) without Tk or EDMC, and reports events/sec, p50/p99
+per-event latency and allocations per event.
+
+    python rankbenchmark.py                       # 100,000 synthetic events
+    python rankbenchmark.py --events 500000 --seed 7
+    python rankbenchmark.py path/to/Journal.2021-06-01T120000.01.log path/to/journal_dir
+    python rankbenchmark.py capture-20210601T200000.edrp
+    python rankbenchmark.py --fail-p99-us 20      # exit with status 1 if p99 latency exceeds 20us
+"""
+import argparse
+import glob
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+from rankcapture import CaptureReader
+from rankcore import LOG, headless_core
+
+# A rough mix of a combat / trading session.  Most events are ones the plugin ignores.
+SYNTHETIC_MIX = [
+    ("Music", 20), ("ReceiveText", 15), ("ShipTargeted", 25), ("UnderAttack", 8), ("FSDTarget", 4),
+    ("FSDJump", 3), ("Docked", 2), ("Undocked", 2), ("Bounty", 10), ("FactionKillBond", 6),
+    ("MarketBuy", 2), ("MarketSell", 2), ("SellExplorationData", 1), ("MultiSellExplorationData", 1),
+    ("Progress", 0.2), ("Rank", 0.1),
+]
+
+
+def synthetic_entry(rng, event):
+    """
+    Build a plausible journal entry for an event name
+    """
+    entry = {"timestamp": "2021-06-01T12:00:00Z", "event": event}
+    if event == "Bounty":
+        entry.update({"Rewards": [{"Faction": "Pilots Federation", "Reward": rng.randint(1000, 500000)}],
+                      "Target": "python", "TotalReward": rng.randint(1000, 500000), "VictimFaction": "Pirates"})
+    elif event == "FactionKillBond":
+        entry.update({"Reward": rng.randint(10000, 80000), "AwardingFaction": "Alliance",
+                      "VictimFaction": "Empire"})
+    elif event == "MarketBuy":
+        entry.update({"Type": "gold", "Count": rng.randint(1, 720), "BuyPrice": 9000, "TotalCost": 9000})
+    elif event == "MarketSell":
+        entry.update({"Type": "gold", "Count": rng.randint(1, 720), "SellPrice": 11000, "TotalSale": 11000,
+                      "AvgPricePaid": 9000})
+    elif event in ("SellExplorationData", "MultiSellExplorationData"):
+        entry.update({"Systems": ["Sol"], "BaseValue": 1000, "Bonus": 0, "TotalEarnings": rng.randint(1000, 10 ** 7)})
+    elif event in ("Progress", "Rank"):
+        entry.update({"Combat": rng.randint(0, 100), "Trade": rng.randint(0, 100), "Explore": rng.randint(0, 100),
+                      "Soldier": rng.randint(0, 100), "Exobiologist": rng.randint(0, 100),
+                      "Empire": rng.randint(0, 100), "Federation": rng.randint(0, 100), "CQC": 0})
+        if event == "Rank":
+            for key in ("Combat", "Trade", "Explore", "Soldier", "Exobiologist"):
+                entry[key] = entry[key] % 14
+            entry["Empire"] %= 15
+            entry["Federation"] %= 15
+    elif event == "ShipTargeted":
+        entry.update({"TargetLocked": True, "Ship": "python", "ScanStage": 3, "PilotName": "Pirate",
+                      "LegalStatus": "Wanted", "Bounty": 250000})
+    return entry
+
+
+def synthetic_stream(count, seed):
+    """
+    A reproducible list of synthetic journal entries
+    """
+    rng = random.Random(seed)
+    events = [name for name, _ in SYNTHETIC_MIX]
+    weights = [weight for _, weight in SYNTHETIC_MIX]
+    return [synthetic_entry(rng, event) for event in rng.choices(events, weights, k=count)]
+
+
+def recorded_stream(paths):
+    """
+    Load journal entries from Journal*.log files or captures, directories are searched for journal files
+    """
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(glob.glob(os.path.join(path, "Journal*.log"))))
+        else:
+            files.append(path)
+
+    entries = []
+    for name in files:
+        if name.endswith(".edrp"):
+            reader = CaptureReader(name)
+            entries.extend(record[5] for record in reader.entries())
+            reader.close()
+            continue
+        with open(name, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # Partial last line of a live journal
+                if "event" in entry:
+                    entries.append(entry)
+    return entries
+
+
+def time_stream(entries):
+    """
+    Replay entries and time each call
+    :return: (total seconds, list of per event latencies in ns, latencies grouped by event name)
+    """
+    core = headless_core()
+    journal_entry = core.journal_entry
+    clock = time.perf_counter_ns
+    latencies = []
+    by_event = dict()
+
+    start = clock()
+    for entry in entries:
+        t0 = clock()
+        journal_entry("Cmdr", False, "Sol", None, entry, None)
+        elapsed = clock() - t0
+        latencies.append(elapsed)
+        by_event.setdefault(entry["event"], []).append(elapsed)
+    total = (clock() - start) / 1e9
+    return total, latencies, by_event
+
+
+def measure_allocations(entries):
+    """
+    Replay entries under tracemalloc
+    :return: (net allocated blocks per event, peak traced bytes)
+    """
+    core = headless_core()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    for entry in entries:
+        core.journal_entry("Cmdr", False, "Sol", None, entry, None)
+    after = tracemalloc.take_snapshot()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    blocks = sum(stat.count_diff for stat in after.compare_to(before, "lineno"))
+    return blocks / max(len(entries), 1), peak
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * pct / 100))]
+
+
+def report(entries, out=sys.stdout):
+    """
+    Run the benchmark and print the results
+    :return: the p99 latency in microseconds
+    """
+    time_stream(entries[:1000])  # Warm up
+    total, latencies, by_event = time_stream(entries)
+    blocks, peak = measure_allocations(entries)
+
+    latencies.sort()
+    p50 = percentile(latencies, 50) / 1000
+    p99 = percentile(latencies, 99) / 1000
+    out.write(f"events:          {len(entries):,}\n")
+    out.write(f"events/sec:      {len(entries) / total:,.0f}\n")
+    out.write(f"p50 latency:     {p50:.2f}us\n")
+    out.write(f"p99 latency:     {p99:.2f}us\n")
+    out.write(f"allocs/event:    {blocks:.3f} net blocks\n")
+    out.write(f"peak traced:     {peak / 1024:,.1f}KiB\n")
+    out.write("\n{:<26}{:>10}{:>12}{:>12}\n".format("event", "count", "p50 us", "p99 us"))
+    for event, values in sorted(by_event.items(), key=lambda item: -len(item[1])):
+        values.sort()
+        out.write("{:<26}{:>10,}{:>12.2f}{:>12.2f}\n".format(
+            event, len(values), percentile(values, 50) / 1000, percentile(values, 99) / 1000))
+    return p99
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay journal events through the plugin and time them")
+    parser.add_argument("journals", nargs="*", help="Journal*.log files, journal directories or captures to replay")
+    parser.add_argument("--events", type=int, default=100000, help="number of synthetic events")
+    parser.add_argument("--seed", type=int, default=1, help="seed for the synthetic stream")
+    parser.add_argument("--fail-p99-us", type=float, default=None,
+                        help="exit with status 1 if the p99 latency is above this many microseconds")
+    parser.add_argument("--log-level", default="WARNING", choices=sorted(LOG.LEVEL_MAPPING),
+                        help="plugin log level while replaying, INFO includes the cost of the plugin's logging")
+    args = parser.parse_args(argv)
+    LOG.configure(level=args.log_level)
+
+    if args.journals:
+        entries = recorded_stream(args.journals)
+    else:
+        entries = synthetic_stream(args.events, args.seed)
+    if not entries:
+        parser.error("no journal events found")
+
+    p99 = report(entries)
+    if args.fail_p99_us is not None and p99 > args.fail_p99_us:
+        print(f"FAIL: p99 {p99:.2f}us > {args.fail_p99_us}us")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
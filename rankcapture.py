@@ -0,0 +1,287 @@
+"""
+Record and replay of the journal entries the plugin is given.
+
+A capture file holds every call to journal_entry (the time it was made, commander, beta flag, system, station
+and the entry), so a real session, bursts included, can be replayed later at the speed it happened, faster or as
+fast as possible.  To look at or replay a capture without EDMC:
+
+    python rankcapture.py info capture-20210601T200000.edrp
+    python rankcapture.py replay capture-20210601T200000.edrp --speed 10 --start 2021-06-01T21:30:00Z
+
+Layout: CAPTURE_MAGIC, the blocks of records, the index block and the footer.  A block is a header (compressed
+size, record count) and the zlib compressed records, each a uint32 length and the JSON array
+[time, cmdr, is_beta, system, station, entry].  Blocks are compressed separately, so with the index (first record
+number, first time and file offset of each block) a reader seeks to any record or time by decompressing just one
+block.  A capture that was never closed (EDMC crashed) has no index, the reader rebuilds it from the block
+headers and drops a block cut short.
+"""
+import argparse
+import json
+import struct
+import sys
+import time
+import zlib
+from bisect import bisect_right
+
+from rankinstrument import Instruments
+from rankcore import headless_core
+from rankrates import journal_time
+
+CAPTURE_MAGIC = b"EDRPCAP1"
+INDEX_MAGIC = b"EDRPIDX1"
+BLOCK_HEADER = struct.Struct("<II")  # compressed size, record count
+RECORD_LENGTH = struct.Struct("<I")
+FOOTER = struct.Struct("<Q8s")  # offset of the index block, INDEX_MAGIC
+INDEX_BLOCK = 0xFFFFFFFF  # the record count that marks the index block
+BLOCK_RECORDS = 256
+BLOCK_BYTES = 64 * 1024  # uncompressed
+COMPRESSION = 6  # zlib level
+
+
+def capture_name(t=None):
+    """
+    The file name for a capture started at t, e.g. capture-20210601T200000.edrp
+    """
+    return time.strftime("capture-%Y%m%dT%H%M%S.edrp", time.gmtime(t))
+
+
+class CaptureWriter(object):
+    """
+    Appends records to a capture file, a block at a time
+    """
+
+    def __init__(self, path, block_records=BLOCK_RECORDS, block_bytes=BLOCK_BYTES):
+        self.path = path
+        self.block_records = block_records
+        self.block_bytes = block_bytes
+        self.file = open(path, "wb")
+        self.file.write(CAPTURE_MAGIC)
+        self.index = []  # [first record, first time, offset] for each block written
+        self.records = 0  # records in the blocks written
+        self.buffer = bytearray()
+        self.count = 0  # records in the buffer
+        self.first_time = None
+
+    def record(self, cmdr, is_beta, system, station, entry, t=None):
+        """
+        Add a journal_entry call, this takes the same arguments as EDMC's journal_entry hook
+        :param t: when it was made, now by default
+        """
+        t = time.time() if t is None else t
+        data = json.dumps([round(t, 3), cmdr, bool(is_beta), system, station, entry],
+                          separators=(",", ":")).encode("utf-8")
+        if not self.count:
+            self.first_time = round(t, 3)
+        self.buffer += RECORD_LENGTH.pack(len(data))
+        self.buffer += data
+        self.count += 1
+        if self.count >= self.block_records or len(self.buffer) >= self.block_bytes:
+            self.write_block()
+
+    def write_block(self):
+        if not self.count:
+            return
+        data = zlib.compress(self.buffer, COMPRESSION)
+        self.index.append([self.records, self.first_time, self.file.tell()])
+        self.file.write(BLOCK_HEADER.pack(len(data), self.count))
+        self.file.write(data)
+        self.file.flush()
+        self.records += self.count
+        self.count = 0
+        self.buffer.clear()
+
+    def close(self):
+        """
+        Write the last block and the index
+        """
+        if self.file is None:
+            return
+        self.write_block()
+        offset = self.file.tell()
+        index = zlib.compress(json.dumps({"records": self.records, "blocks": self.index},
+                                         separators=(",", ":")).encode("utf-8"), COMPRESSION)
+        self.file.write(BLOCK_HEADER.pack(len(index), INDEX_BLOCK))
+        self.file.write(index)
+        self.file.write(FOOTER.pack(offset, INDEX_MAGIC))
+        self.file.close()
+        self.file = None
+
+
+def first_time(block):
+    """
+    The time of the first record in a compressed block, only the start of the block is decompressed
+    """
+    decompressor = zlib.decompressobj()
+    head = decompressor.decompress(block, RECORD_LENGTH.size)
+    size, = RECORD_LENGTH.unpack(head)
+    record = decompressor.decompress(decompressor.unconsumed_tail, size)
+    return json.loads(record)[0]
+
+
+class CaptureReader(object):
+    """
+    Random access to the records of a capture file
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "rb")
+        if self.file.read(len(CAPTURE_MAGIC)) != CAPTURE_MAGIC:
+            self.file.close()
+            raise ValueError(f"{path} is not a capture file")
+        self.records, self.blocks = self.read_index()
+        self.firsts = [first for first, _, _ in self.blocks]
+        self.times = [t for _, t, _ in self.blocks]
+
+    def __len__(self):
+        return self.records
+
+    def close(self):
+        self.file.close()
+
+    def read_index(self):
+        """
+        :return: (number of records, [first record, first time, offset] for each block)
+        """
+        f = self.file
+        size = f.seek(0, 2)
+        if size >= len(CAPTURE_MAGIC) + BLOCK_HEADER.size + FOOTER.size:
+            f.seek(size - FOOTER.size)
+            offset, magic = FOOTER.unpack(f.read(FOOTER.size))
+            if magic == INDEX_MAGIC:
+                f.seek(offset)
+                length, _ = BLOCK_HEADER.unpack(f.read(BLOCK_HEADER.size))
+                index = json.loads(zlib.decompress(f.read(length)))
+                return index["records"], index["blocks"]
+        return self.scan()
+
+    def scan(self):
+        """
+        Rebuild the index from the block headers, for a capture that was never closed
+        """
+        f = self.file
+        offset = f.seek(len(CAPTURE_MAGIC))
+        blocks = []
+        records = 0
+        while True:
+            header = f.read(BLOCK_HEADER.size)
+            if len(header) < BLOCK_HEADER.size:
+                break
+            length, count = BLOCK_HEADER.unpack(header)
+            if count == INDEX_BLOCK:
+                break
+            data = f.read(length)
+            if len(data) < length:
+                break  # The writer stopped part way through this block
+            try:
+                blocks.append([records, first_time(data), offset])
+            except (zlib.error, ValueError, struct.error):
+                break
+            records += count
+            offset += BLOCK_HEADER.size + length
+        return records, blocks
+
+    def read_block(self, block):
+        """
+        :return: the records in a block, as (time, cmdr, is_beta, system, station, entry) lists
+        """
+        f = self.file
+        f.seek(self.blocks[block][2])
+        length, count = BLOCK_HEADER.unpack(f.read(BLOCK_HEADER.size))
+        data = zlib.decompress(f.read(length))
+        records = []
+        pos = 0
+        for _ in range(count):
+            size, = RECORD_LENGTH.unpack_from(data, pos)
+            pos += RECORD_LENGTH.size
+            records.append(json.loads(data[pos:pos + size]))
+            pos += size
+        return records
+
+    def seek_time(self, t):
+        """
+        :param t: unix timestamp
+        :return: the number of the first record made at or after t, len(self) if there are none
+        """
+        if not self.blocks:
+            return 0
+        block = max(bisect_right(self.times, t) - 1, 0)
+        for i, record in enumerate(self.read_block(block)):
+            if record[0] >= t:
+                return self.firsts[block] + i
+        return self.firsts[block + 1] if block + 1 < len(self.blocks) else self.records
+
+    def entries(self, start=0):
+        """
+        The records from record number start on
+        :return: generator of (time, cmdr, is_beta, system, station, entry) lists
+        """
+        block = max(bisect_right(self.firsts, start) - 1, 0)
+        for i in range(block, len(self.blocks)):
+            records = self.read_block(i)
+            yield from records[start - self.firsts[i]:] if i == block else records
+
+
+def replay(reader, journal_entry, speed=None, start=0, sleep=time.sleep):
+    """
+    Feed a capture to a journal_entry function, e.g. load.journal_entry or RankCore.journal_entry
+    :param speed: 1 for the speed it was recorded at, 10 for ten times faster, None for as fast as possible
+    :param start: the record to start from, see CaptureReader.seek_time
+    :return: the number of records replayed
+    """
+    count = 0
+    origin = None
+    for t, cmdr, is_beta, system, station, entry in reader.entries(start):
+        if speed:
+            if origin is None:
+                origin = (t, time.monotonic())
+            delay = (t - origin[0]) / speed - (time.monotonic() - origin[1])
+            if delay > 0:
+                sleep(delay)
+        journal_entry(cmdr, is_beta, system, station, entry, {})
+        count += 1
+    return count
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Look at or replay a capture of the plugin's journal events")
+    parser.add_argument("command", choices=("info", "replay"))
+    parser.add_argument("capture", help="a capture-*.edrp file")
+    parser.add_argument("--speed", type=float, default=None, help="replay speed, 1 is as recorded, fastest if unset")
+    parser.add_argument("--start", default=None, help="replay from this time, e.g. 2021-06-01T21:30:00Z")
+    parser.add_argument("--record", type=int, default=0, help="replay from this record number")
+    args = parser.parse_args(argv)
+
+    reader = CaptureReader(args.capture)
+    if args.command == "info":
+        print(f"{len(reader):,} records in {len(reader.blocks):,} blocks")
+        if reader.blocks:
+            last = reader.read_block(len(reader.blocks) - 1)[-1][0]
+            print("From {} to {}".format(time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(reader.times[0])),
+                                         time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(last))))
+        reader.close()
+        return 0
+
+    start = args.record
+    if args.start:
+        start = reader.seek_time(journal_time({"timestamp": args.start}))
+    core = headless_core()
+    instruments = Instruments(enabled=True)
+    core.store.flush = instruments.timed("config", core.store.flush)
+
+    def journal_entry(cmdr, is_beta, system, station, entry, state):
+        begin = time.perf_counter_ns()
+        core.journal_entry(cmdr, is_beta, system, station, entry, state)
+        instruments.event(entry, (time.perf_counter_ns() - begin) // 1000)
+
+    count = replay(reader, journal_entry, args.speed, start)
+    core.store.flush()
+    reader.close()
+    print(f"Replayed {count:,} records from record {start:,}")
+    print(instruments.summary())
+    core.log_data()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,122 @@
+"""
+Cost basis ledger for the cargo hold, so trade profit can be worked out from what we actually paid.
+
+The game's AvgPricePaid in MarketSell is unreliable for cargo bought over several purchases, mined or from
+missions.  CargoLedger tracks each commodity we hold with either a weighted average cost or FIFO lots.
+
+Buying and selling are O(1) (FIFO sales are O(1) per lot used up) and a commodity is forgotten as soon as the
+hold has none of it, so memory is bounded by the number of different commodities in the hold.
+"""
+from collections import deque
+
+AVERAGE = "average"
+FIFO = "fifo"
+
+
+def commodity_name(symbol):
+    """
+    The commodity name we key the hold by, the journal has both "painite" and "$Painite_Name;" for the same thing
+    """
+    name = symbol.lower()
+    if name.startswith("$") and name.endswith("_name;"):
+        name = name[1:-6]
+    return name
+
+
+class CargoLedger(object):
+    """
+    Per commodity count and cost basis.
+
+    Cargo we know about but don't know the cost of (e.g. already in the hold when we started) is held at an
+    unknown cost, when it is sold the game's AvgPricePaid is used for it.
+    """
+
+    def __init__(self, method=AVERAGE):
+        """
+        :param method: AVERAGE or FIFO
+        """
+        self.method = method
+        self.holds = dict()  # commodity -> deque of [count, unit cost or None] lots, one lot for AVERAGE
+
+    def count(self, commodity):
+        return sum(lot[0] for lot in self.holds.get(commodity, ()))
+
+    def add(self, commodity, count, unit_cost):
+        """
+        Add cargo to the hold, unit_cost None if we don't know it
+        """
+        if count <= 0:
+            return
+        lots = self.holds.get(commodity)
+        if lots is None:
+            self.holds[commodity] = deque([[count, unit_cost]])
+            return
+        last = lots[-1]
+        if last[1] == unit_cost:
+            last[0] += count
+        elif self.method == FIFO or last[1] is None or unit_cost is None:
+            lots.append([count, unit_cost])
+        else:
+            # Weighted average of the known cost lot
+            last[1] = (last[0] * last[1] + count * unit_cost) / (last[0] + count)
+            last[0] += count
+
+    def remove(self, commodity, count, fallback_cost=0):
+        """
+        Take cargo out of the hold, oldest lots first
+        :param fallback_cost: unit cost for cargo at an unknown cost, or that we didn't know we had
+        :return: the cost basis of the cargo removed
+        """
+        lots = self.holds.get(commodity)
+        cost = 0
+        while count > 0 and lots:
+            lot = lots[0]
+            used = min(count, lot[0])
+            cost += used * (fallback_cost if lot[1] is None else lot[1])
+            lot[0] -= used
+            count -= used
+            if lot[0] == 0:
+                lots.popleft()
+        if count > 0:
+            cost += count * fallback_cost
+        if lots is not None and not lots:
+            del self.holds[commodity]
+        return cost
+
+    def buy(self, commodity, count, unit_price):
+        self.add(commodity, count, unit_price)
+
+    def sell(self, commodity, count, unit_price, avg_price_paid=0):
+        """
+        Sell cargo
+        :param avg_price_paid: the game's AvgPricePaid, used for cargo we have no cost for
+        :return: the realized profit
+        """
+        return count * unit_price - self.remove(commodity, count, avg_price_paid)
+
+    def snapshot(self):
+        """
+        The hold as plain lists, see restore
+        """
+        return {commodity: [list(lot) for lot in lots] for commodity, lots in self.holds.items()}
+
+    def restore(self, holds):
+        self.holds = {commodity: deque([count, cost] for count, cost in lots) for commodity, lots in holds.items()}
+
+    def seed(self, counts):
+        """
+        Reconcile the hold with the game's inventory.
+
+        Commodities we have too few of are topped up at an unknown cost, ones we have too many of (jettisoned,
+        used in missions...) are trimmed, and ones no longer in the hold are dropped.
+        :param counts: dict of commodity -> count in the hold, with the names from commodity_name
+        """
+        for commodity in list(self.holds):
+            if commodity not in counts:
+                del self.holds[commodity]
+        for commodity, count in counts.items():
+            held = self.count(commodity)
+            if held < count:
+                self.add(commodity, count - held, None)
+            elif held > count:
+                self.remove(commodity, held - count)
@@ -0,0 +1,423 @@
+"""
+Headless core of the Rank Progress plugin.
+
+RankCore holds the rank and progress state and the session counters, and applies journal events to them.
+It has no Tk or EDMC dependencies: config is injected as a StateStore and the UI as a RankView, so the same
+code runs in EDMC, in the benchmark and in other tools.
+"""
+from rankcargo import AVERAGE, CargoLedger, commodity_name
+from rankestimator import KIND_TRACKS, ProgressEstimator
+from rankstate import TRACK_ABBREVIATIONS, TRACK_INDEX, TRACK_KEYS, TRACKS, RankState
+from rankstatestore import MemoryConfig, StateStore
+from rankrates import RateEngine, journal_time
+from ranklogger import RankLogger
+
+LOG = RankLogger()
+LOG_FORMAT = " ".join(f"{abbreviation}=%s" for abbreviation in TRACK_ABBREVIATIONS)
+
+combat_ranks = {0: "Harmless", 1: "Mostly Harmless", 2: "Novice", 3: "Competent", 4: "Expert",
+                5: "Master", 6: "Dangerous", 7: "Deadly", 8: "Elite", 9: "Elite I", 10: "Elite II", 11: "Elite III",
+                12: "Elite IV", 13: "Elite V"}
+trade_ranks = {0: "Penniless", 1: "Mostly Penniless", 2: "Peddler", 3: "Dealer", 4: "Merchant",
+               5: "Broker", 6: "Entrepreneur", 7: "Tycoon", 8: "Elite", 9: "Elite I", 10: "Elite II", 11: "Elite III",
+               12: "Elite IV", 13: "Elite V"}
+explore_ranks = {0: "Aimless", 1: "Mostly Aimless", 2: "Scout", 3: "Surveyor", 4: "Trailblazer",
+                 5: "Pathfinder", 6: "Ranger", 7: "Pioneer", 8: "Elite", 9: "Elite I", 10: "Elite II",
+                 11: "Elite III", 12: "Elite IV", 13: "Elite V"}
+soldier_ranks = {0: "Defenceless", 1: "Mostly Defenceless", 2: "Rookie", 3: "Soldier", 4: "Gunslinger",
+                 5: "Warrior", 6: "Gladiator", 7: "Deadeye", 8: "Elite", 9: "Elite I", 10: "Elite II",
+                 11: "Elite III", 12: "Elite IV", 13: "Elite V"}
+exobiologist_ranks = {0: "Directionless", 1: "Mostly Directionless", 2: "Compiler", 3: "Collector", 4: "Cataloguer",
+                      5: "Taxonomist", 6: "Ecologist", 7: "Geneticist", 8: "Elite", 9: "Elite I", 10: "Elite II",
+                      11: "Elite III", 12: "Elite IV", 13: "Elite V"}
+federation_ranks = {0: "None", 1: "Recruit", 2: "Cadet", 3: "Midshipman", 4: "Petty Officer",
+                    5: "Chief Petty Officer", 6: "Warrant Officer", 7: "Ensign", 8: "Lieutenant",
+                    9: "Lieutenant Commander", 10: "Post Commander",
+                    11: "Post Captain", 12: "Rear Admiral", 13: "Vice Admiral", 14: "Admiral"}
+empire_ranks = {0: "None", 1: "Outsider", 2: "Serf", 3: "Master", 4: "Squire",
+                5: "Knight", 6: "Lord", 7: "Baron", 8: "Viscount", 9: "Count", 10: "Earl",
+                11: "Marquis", 12: "Duke", 13: "Prince", 14: "King"}
+
+
+class RankView(object):
+    """
+    The interface RankCore uses to tell the UI its data changed.  This base class does nothing, so a
+    RankCore without a view runs headless.
+    """
+
+    def stats_changed(self):
+        """
+        Ranks or progress changed
+        """
+        pass
+
+    def combat_stats_changed(self):
+        """
+        The session counters (bounties, bonds, profit, exploration data) changed
+        """
+        pass
+
+
+class RankCore(object):
+    """
+    Rank progress state and session counters, updated from journal events
+    """
+
+    def __init__(self, store, view=None, ledger=None, cargo_method=AVERAGE, prefix="edrp_") -> None:
+        """
+        :param store: a StateStore used to persist the last seen ranks and progress
+        :param prefix: prefix for our config keys, see rankprofiles.profile_prefix
+        :param view: the RankView to notify of changes, None to run headless
+        :param ledger: an optional Ledger to record reward events in
+        :param cargo_method: cost basis for trade profit, rankcargo.AVERAGE or rankcargo.FIFO
+        """
+        # Be sure to use names that wont collide in our config variables
+        self.store = store
+        self.prefix = prefix
+        self.view = view or RankView()
+        self.ledger = ledger
+        self.analytics = None  # Optional rankanalytics.SessionColumns to add the rewards to
+        self.cmdr = None
+        self.system = None
+        self.game_state = EMPTY  # EDMC's state dict passed with the entry being handled
+        self.rates = RateEngine(TRACKS, REWARD_KINDS.values())
+        self.cargo = CargoLedger(cargo_method)
+
+        # Config keys for each track's progress and rank, in TRACKS order
+        self.progress_keys = tuple(f"{prefix}last_{key}" for key in TRACK_KEYS)
+        self.rank_keys = tuple(f"{prefix}last_{key}_rank" for key in TRACK_KEYS)
+        self.tracks = RankState([store.get_int(key) for key in self.rank_keys],
+                                [store.get_int(key) for key in self.progress_keys])
+
+        # Lifetime totals from the last Statistics event, in LIFETIME_FIELDS order
+        self.lifetime_keys = tuple(f"{prefix}lifetime_{key}" for key in LIFETIME_KEYS)
+        self.lifetime_time_key = f"{prefix}lifetime_time"
+        self.lifetime = [store.get_int(key) for key in self.lifetime_keys]
+        self.lifetime_time = store.get_str(self.lifetime_time_key) or None  # When the game sent them
+        self.lifetime_base = None  # The session counters when Statistics arrived, None if it was before a restart
+
+        self.estimator_key = f"{prefix}progress_model"
+        self.estimator = ProgressEstimator(store.get_str(self.estimator_key))
+
+        self.bounties = 0
+        self.bounties_value = 0
+        self.bonds = 0
+        self.bonds_value = 0
+
+        self.trade_profit = 0
+
+        self.explore_profit = 0
+
+    def log_data(self, level="INFO"):
+        if not LOG.is_enabled(level):
+            return
+        LOG.log("Progress " + LOG_FORMAT, level, *self.tracks.progress)
+        LOG.log("Rank " + LOG_FORMAT, level, *self.tracks.ranks)
+
+    def session_totals(self):
+        """
+        The session counters as a dict, see add_session_totals
+        """
+        return {key: getattr(self, key) for key in SESSION_TOTALS}
+
+    def state(self):
+        """
+        The commander, ranks, progress and session counters as a flat dict, e.g. for the stats server
+        """
+        state = {"cmdr": self.cmdr}
+        tracks = self.tracks
+        for track, key, rank, pct in zip(TRACKS, TRACK_KEYS, tracks.ranks, tracks.progress):
+            state[key] = pct
+            state[key + "_rank"] = rank
+            state[key + "_rank_name"] = RANK_NAMES[track].get(rank, "")
+        for key, track in zip(TRACK_KEYS, ESTIMATED_TRACKS):
+            if track is not None:
+                estimate = self.estimate(track)
+                state[key + "_estimate"] = round(estimate, 1) if estimate is not None else None
+        state.update(self.session_totals())
+        for key, value in self.lifetime_totals().items():
+            state["lifetime_" + key] = value
+        return state
+
+    def estimate(self, track):
+        """
+        Provisional progress for a track from the credits earned since the game last sent its progress, see
+        rankestimator.py
+        :return: the percentage, None if there is nothing to add to the official value
+        """
+        i = TRACK_INDEX[track]
+        return self.estimator.estimate(i, self.tracks.ranks[i], self.tracks.progress[i])
+
+    def lifetime_totals(self):
+        """
+        The lifetime totals as a dict by LIFETIME_KEYS, empty if the game has never sent a Statistics event.
+
+        The game only sends them at login, so what we have counted since is added on.  Totals cached from before
+        a restart are returned as they were at lifetime_time, as we can't tell which of our counts they include.
+        """
+        if self.lifetime_time is None:
+            return {}
+        totals = dict(zip(LIFETIME_KEYS, self.lifetime))
+        if self.lifetime_base is not None:
+            for key, base in self.lifetime_base.items():
+                totals[key] += getattr(self, key) - base
+        return totals
+
+    def snapshot(self):
+        """
+        The state that is not counted from the journals again after a restart, see restore.  The ranks and
+        progress are in config too, but the headless tools keep their config in memory.
+        """
+        return {"tracks": self.tracks.snapshot(), "cargo": self.cargo.snapshot(),
+                "estimator": self.estimator.snapshot()}
+
+    def restore(self, snapshot):
+        """
+        Restore a snapshot, before replaying the events that came after it
+        """
+        tracks = snapshot.get("tracks")
+        if tracks is not None and len(tracks[0]) == len(TRACKS):
+            ranks, progress = tracks
+            self.tracks.ranks[:] = ranks
+            self.tracks.progress[:] = progress
+            for i in range(len(TRACKS)):
+                self.store.set(self.rank_keys[i], ranks[i])
+                self.store.set(self.progress_keys[i], progress[i])
+            self.view.stats_changed()
+        self.cargo.restore(snapshot.get("cargo", {}))
+        self.estimator.restore(snapshot.get("estimator", {}))
+
+    def add_session_totals(self, totals):
+        """
+        Add previously saved session counters to ours, e.g. to carry today's totals over a restart
+        """
+        for key in SESSION_TOTALS:
+            setattr(self, key, getattr(self, key) + totals.get(key, 0))
+            if self.lifetime_base is not None:  # Restored, not earned since the Statistics event
+                self.lifetime_base[key] += totals.get(key, 0)
+        self.rates.reset_credits()
+        self.view.combat_stats_changed()
+
+    def set_session_totals(self, totals):
+        """
+        Replace the session counters, e.g. with today's totals from the ledger
+        """
+        for key in SESSION_TOTALS:
+            if self.lifetime_base is not None:
+                self.lifetime_base[key] += totals.get(key, 0) - getattr(self, key)
+            setattr(self, key, totals.get(key, 0))
+        self.rates.reset_credits()
+        self.view.combat_stats_changed()
+
+    def record(self, kind, count, value, entry):
+        """
+        A reward was counted, record it in the ledger, the analytics and the credit rates
+        """
+        key = REWARD_KINDS[kind]
+        t = journal_time(entry)
+        self.rates.add_credits(key, t, getattr(self, key))
+        self.estimator.credit(kind, t, value)
+        if self.ledger is not None:
+            self.ledger.record(entry.get("timestamp"), self.cmdr, kind, count, value)
+        if self.analytics is not None:
+            self.analytics.record(t, kind, value, entry, self.system)
+
+    def journal_entry(self, cmdr, is_beta, system, station, entry, state):
+        """
+        Apply a journal entry, this takes the same arguments as EDMC's journal_entry hook
+        """
+        handler = EVENT_HANDLERS.get(entry["event"])
+        if handler is None:
+            return  # Not an event we track
+        update, msg, level = handler
+        if msg is not None:
+            LOG.log(msg, level, entry)  # entry is only formatted if the level is enabled
+        self.cmdr = cmdr
+        if system:
+            self.system = system
+        self.game_state = state or EMPTY
+        update(self, entry)
+
+    def update_progress(self, entry):
+        """
+        Update our stats from the log entry
+        :param entry: the log entry as a dictionary
+        :return: nothing
+        """
+        tracks = self.tracks
+        present, changed = tracks.set_progress(entry)
+
+        t = journal_time(entry)
+        learned = False
+        for i in present:
+            self.rates.add_progress(TRACKS[i], t, tracks.ranks[i], tracks.progress[i])
+            learned |= self.estimator.progress(i, t, tracks.ranks[i], tracks.progress[i])
+        if learned:
+            self.store.set(self.estimator_key, self.estimator.to_json())
+
+        self.log_data("DEBUG")  # Every Rank and Progress event, the values are logged at INFO at startup
+
+        for i in changed:
+            self.store.set(self.progress_keys[i], tracks.progress[i])
+
+        self.view.stats_changed()
+
+    def update_ranks(self, entry):
+        """
+        Update our stats from the log entry
+        :param entry: the log entry as a dictionary
+        :return: nothing
+        """
+        _, changed = self.tracks.set_ranks(entry)
+
+        self.log_data("DEBUG")
+
+        for i in changed:
+            self.store.set(self.rank_keys[i], self.tracks.ranks[i])
+
+        self.view.stats_changed()
+
+    def update_statistics(self, entry):
+        """
+        Take the lifetime totals from the Statistics event the game writes at login.  Only the LIFETIME_FIELDS
+        are read, the rest of this large entry is neither kept nor logged.
+        """
+        lifetime = [entry.get(section, EMPTY).get(field, 0) for section, field, _ in LIFETIME_FIELDS]
+        LOG.log("Statistics " + LIFETIME_LOG_FORMAT, "DEBUG", *lifetime)
+
+        for key, old, new in zip(self.lifetime_keys, self.lifetime, lifetime):
+            if old != new:
+                self.store.set(key, new)
+        self.lifetime = lifetime
+        self.lifetime_time = entry.get("timestamp")
+        self.store.set(self.lifetime_time_key, self.lifetime_time)
+        self.lifetime_base = {key: getattr(self, key) for key in LIFETIME_KEYS if key in SESSION_TOTALS}
+
+        self.view.combat_stats_changed()
+
+    def update_bounty(self, event):
+        self.bounties += 1
+        self.bounties_value += event["TotalReward"]
+        self.record("bounty", 1, event["TotalReward"], event)
+        self.view.combat_stats_changed()
+
+    def update_bond(self, event):
+        self.bonds_value += event["Reward"]
+        self.bonds += 1
+        self.record("bond", 1, event["Reward"], event)
+        self.view.combat_stats_changed()
+
+    def update_market(self, event, is_buy=False):
+        commodity = commodity_name(event["Type"])
+        if is_buy:
+            self.cargo.buy(commodity, event["Count"], event["BuyPrice"])
+        else:
+            # Profit against what we paid, the game's AvgPricePaid is only used for cargo we have no cost for
+            profit = self.cargo.sell(commodity, event["Count"], event["SellPrice"], event.get("AvgPricePaid", 0))
+            self.trade_profit += profit
+            self.record("trade", event["Count"], profit, event)
+            self.view.combat_stats_changed()
+
+    def update_market_buy(self, event):
+        self.update_market(event, True)
+
+    def update_market_sell(self, event):
+        self.update_market(event, False)
+
+    def update_cargo(self, event):
+        """
+        Reconcile the hold with the game's.  The game only writes the Inventory in the event at login, the rest of
+        the time it is in Cargo.json, which EDMC reads into state["Cargo"] before passing the event on.
+        """
+        if event.get("Vessel", "Ship") != "Ship":
+            return
+        if "Inventory" in event:
+            counts = dict()
+            for item in event["Inventory"]:
+                commodity = commodity_name(item["Name"])
+                counts[commodity] = counts.get(commodity, 0) + item["Count"]
+        else:
+            counts = self.game_state.get("Cargo")
+            if counts is None:
+                return  # Not running in EDMC, the cargo events keep the hold up to date
+        self.cargo.seed(counts)
+
+    def update_eject_cargo(self, event):
+        self.cargo.remove(commodity_name(event["Type"]), event["Count"])
+
+    def update_mining_refined(self, event):
+        self.cargo.add(commodity_name(event["Type"]), 1, 0)  # Mined cargo cost us nothing
+
+    def update_collect_cargo(self, event):
+        self.cargo.add(commodity_name(event["Type"]), 1, 0)  # Scooped cargo cost us nothing
+
+    def update_cargo_depot(self, event):
+        # Wing mission cargo, it costs us nothing and delivering it isn't a sale
+        if event.get("UpdateType") == "Collect":
+            self.cargo.add(commodity_name(event["CargoType"]), event["Count"], 0)
+        elif event.get("UpdateType") == "Deliver":
+            self.cargo.remove(commodity_name(event["CargoType"]), event["Count"])
+
+    def update_exp_data(self, event):
+        self.explore_profit += event["TotalEarnings"]
+        self.record("exploration", 1, event["TotalEarnings"], event)
+        self.view.combat_stats_changed()
+
+
+def headless_core():
+    """
+    A RankCore with its config in memory and no view, for the command line tools and the tests
+    """
+    return RankCore(StateStore(MemoryConfig()))
+
+
+# The rank names of each track
+RANK_NAMES = {"Combat": combat_ranks, "Trade": trade_ranks, "Explore": explore_ranks, "Soldier": soldier_ranks,
+              "Exobiologist": exobiologist_ranks, "Empire": empire_ranks, "Federation": federation_ranks}
+
+# The tracks the estimator can estimate, in TRACKS order, None for the others
+ESTIMATED_TRACKS = tuple(track if TRACK_INDEX[track] in KIND_TRACKS.values() else None for track in TRACKS)
+
+# The session counters, see session_totals
+SESSION_TOTALS = ("bounties", "bounties_value", "bonds", "bonds_value", "trade_profit", "explore_profit")
+
+# The lifetime totals we take from the Statistics event: section, field and our name for it.  The names that
+# are also session counters have our counts since the event added to them, see lifetime_totals
+LIFETIME_FIELDS = (
+    ("Combat", "Bounties_Claimed", "bounties"),
+    ("Combat", "Bounty_Hunting_Profit", "bounties_value"),
+    ("Combat", "Combat_Bonds", "bonds"),
+    ("Combat", "Combat_Bond_Profits", "bonds_value"),
+    ("Trading", "Market_Profits", "trade_profit"),
+    ("Exploration", "Exploration_Profits", "explore_profit"),
+    ("Exobiology", "Organic_Data_Profits", "exobiology_profit"),
+)
+LIFETIME_KEYS = tuple(key for _, _, key in LIFETIME_FIELDS)
+LIFETIME_LOG_FORMAT = " ".join(f"{key}=%s" for key in LIFETIME_KEYS)
+EMPTY = dict()
+
+# Reward kinds, as recorded in the ledger -> the session counter with their credits
+REWARD_KINDS = {"bounty": "bounties_value", "bond": "bonds_value", "trade": "trade_profit",
+                "exploration": "explore_profit"}
+
+# Journal events we handle: event name -> (handler, log message, log level), no message to not log the entry
+# Every other event is dropped after a single dict lookup
+EVENT_HANDLERS = {
+    "Progress": (RankCore.update_progress, "Progress Event %s", "DEBUG"),
+    "Rank": (RankCore.update_ranks, "Rank event %s", "DEBUG"),
+    "Bounty": (RankCore.update_bounty, "Bounty event %s", "DEBUG"),
+    "FactionKillBond": (RankCore.update_bond, "Bond event %s", "DEBUG"),
+    "MarketBuy": (RankCore.update_market_buy, "Market Buy %s", "DEBUG"),
+    "MarketSell": (RankCore.update_market_sell, "Market Sell %s", "DEBUG"),
+    "SellExplorationData": (RankCore.update_exp_data, "Exploration sell %s", "DEBUG"),
+    "MultiSellExplorationData": (RankCore.update_exp_data, "Exploration sell %s", "DEBUG"),
+    "Cargo": (RankCore.update_cargo, "Cargo %s", "DEBUG"),
+    "EjectCargo": (RankCore.update_eject_cargo, "Eject cargo %s", "DEBUG"),
+    "MiningRefined": (RankCore.update_mining_refined, "Mining refined %s", "DEBUG"),
+    "CollectCargo": (RankCore.update_collect_cargo, "Collect cargo %s", "DEBUG"),
+    "CargoDepot": (RankCore.update_cargo_depot, "Cargo depot %s", "DEBUG"),
+    "Statistics": (RankCore.update_statistics, None, "DEBUG"),  # Too large to log, the handler logs a summary
+}
+
+# The events that feed the session counters, the cargo events are needed for the trade profit
+REWARD_EVENTS = frozenset(EVENT_HANDLERS) - {"Progress", "Rank", "Statistics"}
@@ -0,0 +1,110 @@
+"""
+Provisional progress between the game's Progress events.
+
+The game only sends Progress now and then, so the percentages shown can be hours old.  ProgressEstimator learns
+how much progress the credits we count are worth, for each track and rank, from the credits earned between one
+Progress event and the next.  Until the next event the provisional progress is the last official value plus the
+credits earned since at that rate, and the next Progress event replaces it with the real value.
+
+The model keeps a decayed sum of credits and of progress gained for each track and rank, so learning from a
+Progress event, counting a reward and making an estimate are all O(1).
+"""
+import json
+
+from rankstate import TRACK_INDEX, TRACKS
+
+# The reward kinds that earn progress -> the index of the track they earn it for
+KIND_TRACKS = {"bounty": TRACK_INDEX["Combat"], "bond": TRACK_INDEX["Combat"], "trade": TRACK_INDEX["Trade"],
+               "exploration": TRACK_INDEX["Explore"]}
+DECAY = 0.9  # weight left on what was learned before, at each new observation
+MIN_CREDITS = 100000  # credits (decayed) to have been seen at a rank before we estimate from it
+MAX_PCT = 99.9  # an estimate never shows a rank up, that waits for the game
+
+
+class ProgressEstimator(object):
+    """
+    Credits to progress model, and the credits earned since each track's last Progress event
+    """
+
+    def __init__(self, model=None):
+        """
+        :param model: a model saved by to_json, None to start empty
+        """
+        self.model = dict()  # (track index, rank) -> [credits, progress gained], decayed sums
+        self.pending = [0] * len(TRACKS)  # credits earned since each track's last Progress
+        self.since = [0.0] * len(TRACKS)  # time of each track's last Progress
+        self.last = [None] * len(TRACKS)  # (rank, pct) at each track's last Progress, None until we see one
+        if model:
+            self.load(model)
+
+    def credit(self, kind, t, value):
+        """
+        A reward was counted, rewards from before the track's last Progress (e.g. replayed by backfill) are ignored
+        """
+        i = KIND_TRACKS.get(kind)
+        if i is not None and value > 0 and t > self.since[i]:
+            self.pending[i] += value
+
+    def progress(self, i, t, rank, pct):
+        """
+        A Progress event for track i: learn from the credits earned since the last one and start again from the
+        official value.  Nothing is learned across a rank up, or from the first event we see.
+        :return: True if the model changed
+        """
+        credits = self.pending[i]
+        last = self.last[i]
+        learned = credits > 0 and last is not None and last[0] == rank and pct >= last[1]
+        if learned:
+            sums = self.model.get((i, rank))
+            if sums is None:
+                sums = self.model[(i, rank)] = [0.0, 0.0]
+            sums[0] = sums[0] * DECAY + credits
+            sums[1] = sums[1] * DECAY + pct - last[1]
+        self.pending[i] = 0
+        self.since[i] = t
+        self.last[i] = (rank, pct)
+        return learned
+
+    def estimate(self, i, rank, pct):
+        """
+        :return: the provisional progress for track i, None if nothing was earned since its last Progress or we
+            haven't learned enough about this rank yet
+        """
+        credits = self.pending[i]
+        if not credits:
+            return None
+        sums = self.model.get((i, rank))
+        if sums is None or sums[0] < MIN_CREDITS:
+            return None
+        return min(pct + credits * sums[1] / sums[0], MAX_PCT)
+
+    def snapshot(self):
+        """
+        The credits earned since each track's last Progress, see restore.  The model itself is kept in config.
+        """
+        return {"pending": list(self.pending), "since": list(self.since), "last": list(self.last)}
+
+    def restore(self, snapshot):
+        if len(snapshot.get("pending", ())) != len(TRACKS):
+            return  # Saved with a different set of tracks
+        self.pending = list(snapshot["pending"])
+        self.since = list(snapshot["since"])
+        self.last = [tuple(last) if last is not None else None for last in snapshot["last"]]
+
+    def to_json(self):
+        """
+        The model as compact JSON, e.g. {"Combat":{"5":[1200000.0,3.5]}}
+        """
+        model = dict()
+        for (i, rank), sums in self.model.items():
+            model.setdefault(TRACKS[i], dict())[str(rank)] = [round(sums[0], 1), round(sums[1], 3)]
+        return json.dumps(model, separators=(",", ":"))
+
+    def load(self, text):
+        try:
+            model = json.loads(text)
+            for track, ranks in model.items():
+                for rank, (credits, gain) in ranks.items():
+                    self.model[(TRACK_INDEX[track], int(rank))] = [float(credits), float(gain)]
+        except (ValueError, TypeError, KeyError, AttributeError):
+            self.model.clear()  # Unreadable, start learning again
@@ -0,0 +1,194 @@
+"""
+Offline lifetime statistics indexer.
+
+RankProgress only counts the current session.  This tool reads the whole journal archive, spread over a process
+pool, and builds a compact index of per-day totals and the rank and progress of each rank track for every
+commander:
+
+    python rankindexer.py "%USERPROFILE%\\Saved Games\\Frontier Developments\\Elite Dangerous"
+    python rankindexer.py JOURNAL_DIR --index lifetime.json --workers 8 --cmdr Jameson
+
+Each worker reads one journal and returns per-day partial aggregates, which are merged into the index.  The
+index remembers the byte offset reached in every journal, so running it again only reads new data.
+
+The reward events go through RankCore's own handlers so the totals match what the plugin shows.  This is a
+command line tool, it is not run inside EDMC.
+"""
+import argparse
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+from rankjournals import commander_name, event_name, journal_files, parse, read_lines
+from rankcore import LOG, REWARD_EVENTS, SESSION_TOTALS, TRACKS, headless_core
+
+INDEX_VERSION = 1
+REWARD_EVENT_NAMES = frozenset(name.encode() for name in REWARD_EVENTS)
+RANK_EVENTS = {b"Rank": "r", b"Progress": "p"}
+COMMANDER_EVENTS = (b"Commander", b"LoadGame")
+
+
+def quiet_worker():
+    LOG.configure(level="WARNING")
+
+
+def index_file(task):
+    """
+    Index one journal, this runs in a worker process.
+
+    Day rows are {"t": [session totals in SESSION_TOTALS order], "r": [timestamp, rank per track in TRACKS order],
+    "p": [timestamp, progress per track]}, "r" and "p" are the last Rank and Progress of the day.
+
+    :param task: (path, byte offset to start from, commander if known)
+    :return: (name, offset reached, commander, {cmdr: {day: row}})
+    """
+    path, offset, cmdr = task
+    days = dict()
+    core = headless_core()
+    base = core.session_totals()
+    day = None
+
+    def close_day():
+        totals = core.session_totals()
+        if day is not None and totals != base:
+            row = days.setdefault(cmdr, {}).setdefault(day, {})
+            row["t"] = [a + totals[key] - base[key] for a, key in zip(row.get("t", [0] * len(SESSION_TOTALS)),
+                                                                      SESSION_TOTALS)]
+        return totals
+
+    for end, line in read_lines(path, offset):
+        offset = end
+        name = event_name(line)
+        if name in COMMANDER_EVENTS:
+            base = close_day()
+            cmdr = commander_name(line) or cmdr
+            continue
+        if name not in REWARD_EVENT_NAMES and name not in RANK_EVENTS:
+            continue
+        entry = parse(line)
+        if not entry:
+            continue
+        timestamp = entry.get("timestamp", "")
+        if timestamp[:10] != day:
+            base = close_day()
+            day = timestamp[:10]
+        if name in RANK_EVENTS:
+            row = days.setdefault(cmdr, {}).setdefault(day, {})
+            row[RANK_EVENTS[name]] = [timestamp] + [entry.get(track) for track in TRACKS]
+        else:
+            core.journal_entry(cmdr, False, None, None, entry, None)
+    close_day()
+    return os.path.basename(path), offset, cmdr, days
+
+
+def merge_row(into, row):
+    if "t" in row:
+        into["t"] = [a + b for a, b in zip(into.get("t", [0] * len(SESSION_TOTALS)), row["t"])]
+    for key in ("r", "p"):
+        if key in row:
+            # Keep the latest, but a track missing from the latest (pre Odyssey) keeps its earlier value
+            old, new = into.get(key), row[key]
+            if old is None:
+                into[key] = new
+                continue
+            if old[0] > new[0]:
+                old, new = new, old
+            into[key] = [new[0]] + [n if n is not None else o for n, o in zip(new[1:], old[1:])]
+
+
+def load_index(path):
+    try:
+        with open(path, encoding="utf-8") as f:
+            index = json.load(f)
+        if index.get("version") == INDEX_VERSION:
+            return index
+    except (OSError, ValueError):
+        pass
+    return {"version": INDEX_VERSION, "files": {}, "commanders": {}}
+
+
+def save_index(index, path):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(index, f, separators=(",", ":"), sort_keys=True)
+    os.replace(tmp, path)
+
+
+def build_index(journal_dir, index_path, workers=None):
+    """
+    Bring the index at index_path up to date with the journals in journal_dir
+    :return: the index
+    """
+    index = load_index(index_path)
+    files = index["files"]
+    tasks = []
+    for f in journal_files(journal_dir):
+        offset, cmdr = files.get(f.name, (0, None))
+        size = f.stat().st_size
+        if size > offset:
+            tasks.append((size - offset, (f.path, offset, cmdr)))
+    tasks.sort(reverse=True)  # Largest first balances the pool better
+
+    if tasks:
+        with ProcessPoolExecutor(max_workers=workers, initializer=quiet_worker) as pool:
+            chunksize = max(1, len(tasks) // (4 * (workers or os.cpu_count() or 1)))
+            for name, offset, cmdr, days in pool.map(index_file, [task for _, task in tasks], chunksize=chunksize):
+                files[name] = [offset, cmdr]
+                for day_cmdr, day_rows in days.items():
+                    commander = index["commanders"].setdefault(day_cmdr or "", {})
+                    for day, row in day_rows.items():
+                        merge_row(commander.setdefault(day, {}), row)
+        save_index(index, index_path)
+    return index
+
+
+def lifetime(index, cmdr):
+    """
+    Lifetime summary for a commander
+    :return: (totals by SESSION_TOTALS name, {track: [(day, rank, progress), ...] when either changed})
+    """
+    days = index["commanders"].get(cmdr, {})
+    totals = dict.fromkeys(SESSION_TOTALS, 0)
+    tracks = {track: [] for track in TRACKS}
+    rank = [None] * len(TRACKS)
+    progress = [None] * len(TRACKS)
+    for day in sorted(days):
+        row = days[day]
+        for key, value in zip(SESSION_TOTALS, row.get("t", ())):
+            totals[key] += value
+        rank = [n if n is not None else o for o, n in zip(rank, row.get("r", [None] + rank)[1:])]
+        progress = [n if n is not None else o for o, n in zip(progress, row.get("p", [None] + progress)[1:])]
+        for i, track in enumerate(TRACKS):
+            point = (day, rank[i], progress[i])
+            if point[1:] != (None, None) and (not tracks[track] or tracks[track][-1][1:] != point[1:]):
+                tracks[track].append(point)
+    return totals, tracks
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build a lifetime statistics index from the journal archive")
+    parser.add_argument("journal_dir", help="the game's journal directory")
+    parser.add_argument("--index", default="lifetime.json", help="index file to create or update")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes, default one per CPU")
+    parser.add_argument("--cmdr", default=None, help="commander to summarise, default all")
+    args = parser.parse_args(argv)
+
+    index = build_index(args.journal_dir, args.index, args.workers)
+    for cmdr in sorted(index["commanders"]):
+        if args.cmdr is not None and cmdr != args.cmdr:
+            continue
+        totals, tracks = lifetime(index, cmdr)
+        days = index["commanders"][cmdr]
+        print(f"Cmdr {cmdr or '(unknown)'}: {len(days)} days from {min(days)} to {max(days)}")
+        print("  Bounties {:,} for {:,}cr, bonds {:,} for {:,}cr, trade profit {:,}cr, exploration {:,}cr".format(
+            *(totals[key] for key in SESSION_TOTALS)))
+        for track, points in tracks.items():
+            if points:
+                day, rank, progress = points[-1]
+                print(f"  {track:<13} rank {rank} {progress}% on {day}, {len(points)} changes since {points[0][0]}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,138 @@
+"""
+Timings for the plugin's hot paths, to tell whether the plugin is what makes EDMC feel slow.
+
+Instruments counts journal events by type with a latency histogram for each, times the Tk label updates and
+the config writes, and keeps the slowest events seen.  Histograms use power of two microsecond buckets, so
+recording a timing is a few integer operations and the memory used is fixed.  When disabled the only cost is
+checking the enabled flag.
+"""
+import heapq
+import json
+import os
+import time
+
+BUCKETS = 32  # bucket n holds timings of 2**(n-1) to 2**n - 1 microseconds, the last one everything longer
+SLOWEST = 10
+
+
+class Histogram(object):
+    __slots__ = ("count", "total", "max", "buckets")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0
+        self.max = 0
+        self.buckets = [0] * BUCKETS
+
+    def add(self, us):
+        self.count += 1
+        self.total += us
+        if us > self.max:
+            self.max = us
+        self.buckets[min(us.bit_length(), BUCKETS - 1)] += 1
+
+    def percentile(self, pct):
+        """
+        :return: the upper bound in microseconds of the bucket holding the percentile (at most the max), 0 if empty
+        """
+        wanted = self.count * pct / 100
+        seen = 0
+        for bucket, count in enumerate(self.buckets):
+            seen += count
+            if count and seen >= wanted:
+                return min((1 << bucket) - 1, self.max)
+        return 0
+
+    def to_dict(self):
+        return {"count": self.count, "total_us": self.total, "max_us": self.max,
+                "p50_us": self.percentile(50), "p99_us": self.percentile(99),
+                "buckets": {(1 << bucket) - 1: count for bucket, count in enumerate(self.buckets) if count}}
+
+
+class Instruments(object):
+    """
+    Per event type and per section timings
+    """
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.started = time.time()
+        self.events = dict()  # event type -> Histogram
+        self.sections = dict()  # e.g. "ui" or "config" -> Histogram
+        self.slowest = []  # min heap of (us, seq, event type, journal timestamp)
+        self.seq = 0
+
+    def event(self, entry, us):
+        """
+        Record how long a journal entry took to handle
+        """
+        name = entry.get("event")
+        histogram = self.events.get(name)
+        if histogram is None:
+            histogram = self.events[name] = Histogram()
+        histogram.add(us)
+        self.seq += 1
+        slow = (us, self.seq, name, entry.get("timestamp"))
+        if len(self.slowest) < SLOWEST:
+            heapq.heappush(self.slowest, slow)
+        elif us > self.slowest[0][0]:
+            heapq.heapreplace(self.slowest, slow)
+
+    def section(self, name, us):
+        histogram = self.sections.get(name)
+        if histogram is None:
+            histogram = self.sections[name] = Histogram()
+        histogram.add(us)
+
+    def timed(self, name, func):
+        """
+        Wrap a callable so each call is recorded as a section when enabled
+        """
+
+        def wrapper(*args, **kwargs):
+            if not self.enabled:
+                return func(*args, **kwargs)
+            start = time.perf_counter_ns()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.section(name, (time.perf_counter_ns() - start) // 1000)
+
+        return wrapper
+
+    def to_dict(self):
+        return {
+            "started": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(self.started)),
+            "events": {name: histogram.to_dict() for name, histogram in self.events.items()},
+            "sections": {name: histogram.to_dict() for name, histogram in self.sections.items()},
+            "slowest": [{"us": us, "event": name, "timestamp": timestamp}
+                        for us, _, name, timestamp in sorted(self.slowest, reverse=True)],
+        }
+
+    def summary(self, lines=8):
+        """
+        A few lines of text for the preferences tab
+        """
+        if not self.events and not self.sections:
+            return "No timings yet"
+        text = []
+        for name, histogram in sorted(self.sections.items()):
+            text.append(f"{name}: {histogram.count} calls, {histogram.total / 1000:,.1f}ms total, "
+                        f"p99 {histogram.percentile(99)}us")
+        busiest = sorted(self.events.items(), key=lambda item: item[1].total, reverse=True)
+        for name, histogram in busiest[:lines]:
+            text.append(f"{name}: {histogram.count} events, p50 {histogram.percentile(50)}us, "
+                        f"p99 {histogram.percentile(99)}us, max {histogram.max}us")
+        if self.slowest:
+            us, _, name, timestamp = max(self.slowest)
+            text.append(f"Slowest: {name} {us}us at {timestamp}")
+        return "\n".join(text)
+
+    def export(self, path):
+        """
+        Write the timings to a JSON file
+        """
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, indent=1)
+        os.replace(tmp, path)
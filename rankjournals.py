@@ -0,0 +1,95 @@
+"""
+Helpers for streaming the game's Journal.*.log files.
+
+Files are read as bytes, a line at a time, so we always know the byte offset reached and never hold a whole
+journal in memory.  The event name is picked out of the raw line so lines for events we don't care about are
+skipped without being JSON decoded.
+"""
+import json
+import os
+
+EVENT_MARK = b'"event":"'
+COMMANDER_MARKS = (b'"Commander":"', b'"Name":"')  # LoadGame, Commander
+
+
+def default_journal_dir(config):
+    """
+    The journal directory EDMC is using
+    :param config: EDMC's config
+    """
+    journal_dir = config.get_str('journaldir') if hasattr(config, 'get_str') else None
+    return journal_dir or getattr(config, 'default_journal_dir', None)
+
+
+def journal_files(journal_dir, since=None):
+    """
+    The journal files in a directory, oldest first
+    :param since: only this journal and newer ones, by name, the older ones are not looked at any further
+    :return: list of os.DirEntry
+    """
+    if not journal_dir:
+        return []
+    try:
+        with os.scandir(journal_dir) as it:
+            files = [f for f in it if f.name.startswith("Journal") and f.name.endswith(".log")
+                     and (since is None or f.name >= since) and f.is_file()]
+    except OSError:
+        return []
+    # Both the old Journal.YYMMDDhhmmss.01.log and the new Journal.YYYY-MM-DDThhmmss.01.log names sort by time
+    files.sort(key=lambda f: f.name)
+    return files
+
+
+def read_lines(path, offset=0):
+    """
+    Yield each complete line in a journal from offset onwards.
+
+    A partial last line (the game is still writing it) is not returned, so the offset it stops at is always
+    safe to resume from.
+
+    :return: generator of (offset after the line, line as bytes)
+    """
+    with open(path, "rb") as f:
+        f.seek(offset)
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            offset += len(line)
+            yield offset, line
+
+
+def event_name(line):
+    """
+    The event name in a raw journal line, as bytes, without decoding the JSON
+    """
+    start = line.find(EVENT_MARK)
+    if start < 0:
+        return None
+    start += len(EVENT_MARK)
+    return line[start:line.find(b'"', start)]
+
+
+def parse(line):
+    try:
+        return json.loads(line)
+    except ValueError:
+        return None
+
+
+def commander_name(line):
+    """
+    The commander in a raw Commander or LoadGame line.  The name comes near the start, so it is picked out without
+    decoding the rest of the line, the JSON is only decoded if the name has escapes in it.
+    :return: the name, None if the line doesn't have one
+    """
+    for mark in COMMANDER_MARKS:
+        start = line.find(mark)
+        if start < 0:
+            continue
+        start += len(mark)
+        name = line[start:line.find(b'"', start)]
+        if b"\\" not in name:
+            return name.decode("utf-8", "replace") or None
+        entry = parse(line) or {}
+        return entry.get("Commander") or entry.get("Name")
+    return None
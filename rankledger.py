@@ -0,0 +1,209 @@
+"""
+Durable ledger of reward events.
+
+Every bounty, bond, market sale and exploration sale RankCore counts is recorded with its timestamp, commander
+and value in an SQLite database, so today's totals survive an EDMC restart and can be queried later.
+
+record() only puts the row on a queue, a writer thread owns the write connection and inserts the rows in
+batched transactions.  today_later asks the writer for totals in turn with the rows, so nothing is waited for.  The database is in WAL mode so queries on other connections don't block the writer.
+"""
+import queue
+import sqlite3
+import threading
+import time
+from datetime import date, datetime, timedelta, timezone
+
+from ranklogger import RankLogger
+
+LOG = RankLogger()
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS rewards (
+    id INTEGER PRIMARY KEY,
+    ts TEXT NOT NULL,
+    cmdr TEXT,
+    session INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    value INTEGER NOT NULL,
+    seq INTEGER NOT NULL,
+    UNIQUE (cmdr, ts, kind, value, seq)
+);
+CREATE INDEX IF NOT EXISTS rewards_cmdr_ts ON rewards (cmdr, ts);
+CREATE INDEX IF NOT EXISTS rewards_session ON rewards (session);
+"""
+
+TOTALS_SQL = ("SELECT kind, COUNT(*), SUM(count), SUM(value) FROM rewards WHERE cmdr IS ? AND ts >= ? AND ts < ? "
+              "GROUP BY kind")
+
+# Ledger kinds -> the RankCore session counters for (number of events, total count, total value)
+KIND_TOTALS = {
+    "bounty": ("bounties", None, "bounties_value"),
+    "bond": ("bonds", None, "bonds_value"),
+    "trade": (None, None, "trade_profit"),
+    "exploration": (None, None, "explore_profit"),
+}
+
+
+def utc_day_range(day=None):
+    """
+    The [start, end) journal timestamps of a UTC day, today by default
+    """
+    day = day or datetime.now(timezone.utc).date()
+    if isinstance(day, str):
+        day = date.fromisoformat(day)
+    return day.isoformat(), (day + timedelta(days=1)).isoformat()
+
+
+class Ledger(object):
+    """
+    Append only SQLite ledger with a background writer
+    """
+    BATCH_SIZE = 500
+    FLUSH_INTERVAL = 2.0  # seconds
+
+    def __init__(self, path):
+        """
+        :param path: the database file, created if needed
+        """
+        self.path = path
+        self.session = int(time.time())
+        self.queue = queue.SimpleQueue()
+        self.second = None
+        self.seqs = dict()  # (cmdr, kind, value) -> number of those events recorded in self.second
+
+        db = self.connect()
+        db.executescript(SCHEMA)
+        db.close()
+
+        self.reader = None
+        self.writer = threading.Thread(target=self.write_loop, name="EDRankProgress ledger", daemon=True)
+        self.writer.start()
+
+    def connect(self):
+        db = sqlite3.connect(self.path, check_same_thread=False)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        return db
+
+    def record(self, timestamp, cmdr, kind, count, value):
+        """
+        Queue a reward event, this never touches the database so is cheap to call from journal_entry.
+
+        seq numbers otherwise identical events in the same second, so the same event replayed again (e.g. by the
+        backfill after a crash) is ignored but two genuine identical events are both kept, even with other events
+        between them.
+        """
+        timestamp = timestamp or datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+        if timestamp != self.second:
+            self.second = timestamp
+            self.seqs.clear()
+        key = (cmdr, kind, value)
+        seq = self.seqs.get(key, 0)
+        self.seqs[key] = seq + 1
+        self.queue.put((timestamp, cmdr, self.session, kind, count, value, seq))
+
+    def flush(self, timeout=5.0):
+        """
+        Wait until everything recorded so far is in the database
+        """
+        done = threading.Event()
+        self.queue.put(lambda db: done.set())
+        done.wait(timeout)
+
+    def today_later(self, cmdr):
+        """
+        Totals for a commander's rewards today, as today, taken by the writer once everything recorded so far is
+        in the database and before anything recorded after.  This doesn't wait for the writer.
+        :return: a queue.SimpleQueue the totals are put on, or None if the query failed
+        """
+        result = queue.SimpleQueue()
+        start, end = utc_day_range()
+
+        def query(db):
+            try:
+                result.put(self.to_totals(db.execute(TOTALS_SQL, (cmdr, start, end)).fetchall()))
+            except sqlite3.Error as e:
+                LOG.log("Ledger query failed: %s", "WARNING", e)
+                result.put(None)
+
+        self.queue.put(query)
+        return result
+
+    def close(self):
+        """
+        Write everything outstanding and stop the writer, call this at shutdown
+        """
+        self.queue.put(None)
+        self.writer.join(10.0)
+        if self.reader is not None:
+            self.reader.close()
+            self.reader = None
+
+    def write_loop(self):
+        db = self.connect()
+        rows = []
+        waiting = []
+        running = True
+        while running:
+            deadline = time.monotonic() + self.FLUSH_INTERVAL
+            while len(rows) < self.BATCH_SIZE:
+                try:
+                    item = self.queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is None:
+                    running = False
+                    break
+                if callable(item):  # Runs once the rows before it are written
+                    waiting.append(item)
+                    break
+                rows.append(item)
+            if rows:
+                try:
+                    with db:
+                        db.executemany("INSERT OR IGNORE INTO rewards (ts, cmdr, session, kind, count, value, seq) "
+                                       "VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+                    LOG.log("Ledger wrote %d rows", "DEBUG", len(rows))
+                except sqlite3.Error as e:
+                    LOG.log("Ledger write failed: %s", "WARNING", e)
+                rows = []
+            for call in waiting:
+                call(db)
+            waiting = []
+        db.close()
+
+    def query(self, sql, args):
+        if self.reader is None:
+            self.reader = self.connect()
+        return self.reader.execute(sql, args).fetchall()
+
+    def totals(self, cmdr, start, end):
+        """
+        Totals for a commander's rewards with start <= timestamp < end
+        :return: dict of RankCore session counters, see RankCore.session_totals
+        """
+        return self.to_totals(self.query(TOTALS_SQL, (cmdr, start, end)))
+
+    def today(self, cmdr):
+        """
+        Totals for a commander's rewards today (UTC, as the journal timestamps are)
+        """
+        return self.totals(cmdr, *utc_day_range())
+
+    def session_totals(self, session=None):
+        """
+        Totals for the rewards recorded in a session, this session by default
+        """
+        return self.to_totals(self.query(
+            "SELECT kind, COUNT(*), SUM(count), SUM(value) FROM rewards WHERE session = ? GROUP BY kind",
+            (self.session if session is None else session,)))
+
+    @staticmethod
+    def to_totals(rows):
+        totals = dict()
+        for kind, events, count, value in rows:
+            for key, amount in zip(KIND_TOTALS.get(kind, ()), (events, count, value)):
+                if key is not None:
+                    totals[key] = totals.get(key, 0) + amount
+        return totals
@@ -1,33 +1,183 @@
 """
 This logger is based on the EDR plugin logger  (thank you)
+
+Records are put on a queue on the calling thread (usually EDMC's Tk thread) and written by a QueueListener thread,
+so a slow console or log file never stalls the UI.  Messages are only %-formatted once they are off the Tk thread,
+and repeats of the same message can be rate limited.
 """
+import atexit
 import logging
-import sys
+import logging.handlers
 import os
-from config import appname
+import queue
+import sys
+import threading
+import time
+
+try:
+    from config import appname
+except ImportError:  # Running outside EDMC, e.g. the benchmark
+    appname = "EDMarketConnector"
 
 if sys.version_info.major == 3:
     sys.stdout.reconfigure(encoding="utf-8")
 
 
+class ParentHandler(logging.Handler):
+    """
+    Hands records on to a logger, on the listener thread, so they reach EDMC's handlers (or ours)
+    """
+
+    def __init__(self, logger):
+        super().__init__()
+        self.target = logger
+
+    def emit(self, record):
+        self.target.handle(record)
+
+
+class LazyQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that leaves formatting to the listener thread.
+
+    The stock QueueHandler formats the message before queueing it, which is the work we want off the Tk thread.
+    Our args are numbers, strings and journal entries that are not changed after they are logged, so it is safe
+    to format them later.
+    """
+
+    def prepare(self, record):
+        return record
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Drops repeats of a message (the same format string and level) logged within interval seconds of the last one
+    let through, the next one let through says how many were dropped.
+    """
+
+    def __init__(self, interval=0.0):
+        """
+        :param interval: seconds, 0 to let everything through
+        """
+        super().__init__()
+        self.interval = interval
+        self.last = dict()  # (msg, level) -> [time last let through, number dropped since]
+
+    def filter(self, record):
+        if not self.interval:
+            return True
+        key = (record.msg, record.levelno)
+        now = time.monotonic()
+        seen = self.last.get(key)
+        if seen is None:
+            if len(self.last) > 1000:  # Don't grow without bound on messages that are never repeated
+                self.last.clear()
+            self.last[key] = [now, 0]
+            return True
+        if now - seen[0] < self.interval:
+            seen[1] += 1
+            return False
+        if seen[1]:
+            record.msg = f"{record.msg} ({seen[1]} similar messages suppressed)"
+        seen[0] = now
+        seen[1] = 0
+        return True
+
+
 class RankLogger(object):
     LEVEL_MAPPING = {"DEBUG": logging.DEBUG, "INFO": logging.INFO, "WARNING": logging.WARNING, "ERROR": logging.ERROR,
                      "CRITICAL": logging.CRITICAL}
     PLUGIN_NAME = os.path.basename(os.path.dirname(__file__))
 
+    # Shared by every RankLogger, they all log to the same logging.Logger
+    started = False
+    listener = None
+    handler = None
+    direct = None
+    rate_limit = RateLimitFilter()
+    lock = threading.Lock()
+
     def __init__(self):
         self.logger = logging.getLogger(f'{appname}.{self.PLUGIN_NAME}')
+        with self.lock:
+            if not RankLogger.started:
+                self.start()
+
+    def start(self):
+        """
+        Route our logger through a queue to a listener thread
+        """
         level = self.LEVEL_MAPPING.get("INFO", logging.NOTSET)
         self.logger.setLevel(level)
-        if not self.logger.hasHandlers():
+        parent = self.logger.parent
+        if parent is None or not parent.hasHandlers():
+            # Running on our own, write to stderr
+            parent = logging.getLogger(f'{self.logger.name}.writer')
+            parent.propagate = False
             logger_channel = logging.StreamHandler()
             logger_formatter = logging.Formatter(
                 f'%(asctime)s - %(name)s - %(levelname)s - %(module)s:%(lineno)d:%(funcName)s: %(message)s')
             logger_formatter.default_time_format = '%Y-%m-%d %H:%M:%S'
             logger_formatter.default_msec_format = '%s.%03d'
             logger_channel.setFormatter(logger_formatter)
-            self.logger.addHandler(logger_channel)
+            parent.addHandler(logger_channel)
+
+        records = queue.SimpleQueue()
+        RankLogger.started = True
+        RankLogger.direct = ParentHandler(parent)
+        RankLogger.handler = LazyQueueHandler(records)
+        RankLogger.handler.addFilter(self.rate_limit)
+        self.logger.addHandler(RankLogger.handler)
+        self.logger.propagate = False  # The listener hands records to the parent's handlers
+        RankLogger.listener = logging.handlers.QueueListener(records, RankLogger.direct)
+        RankLogger.listener.start()
+        atexit.register(RankLogger.stop)
+        if hasattr(os, "register_at_fork"):
+            # A forked process (e.g. an indexer worker) has the queue but not the listener thread
+            os.register_at_fork(after_in_child=RankLogger.detach)
+
+    @classmethod
+    def stop(cls):
+        """
+        Write everything queued and stop the listener thread, call this at shutdown.  Anything logged after this
+        is written directly.
+        """
+        with cls.lock:
+            if cls.listener is not None:
+                cls.listener.stop()
+                cls.detach()
+
+    @classmethod
+    def detach(cls):
+        """
+        Stop queueing, records are handed to the parent's handlers on the thread that logs them
+        """
+        if cls.handler is None:
+            return
+        logger = logging.getLogger(f'{appname}.{cls.PLUGIN_NAME}')
+        logger.removeHandler(cls.handler)
+        cls.direct.addFilter(cls.rate_limit)
+        logger.addHandler(cls.direct)
+        cls.listener = None
+        cls.handler = None
+
+    def configure(self, level=None, rate_limit=None):
+        """
+        :param level: the level name, e.g. "INFO"
+        :param rate_limit: seconds between repeats of the same message, 0 for no limit
+        """
+        if level is not None:
+            self.logger.setLevel(self.LEVEL_MAPPING.get(level, logging.INFO))
+        if rate_limit is not None:
+            self.rate_limit.interval = rate_limit
+
+    def is_enabled(self, level):
+        return self.logger.isEnabledFor(self.LEVEL_MAPPING.get(level, logging.NOTSET))
 
-    def log(self, msg, level):
+    def log(self, msg, level, *args):
+        """
+        Log a message, any args are only %-formatted into msg if the level is enabled, on the listener thread
+        """
         level = self.LEVEL_MAPPING.get(level, logging.NOTSET)
-        self.logger.log(level, msg)
+        if self.logger.isEnabledFor(level):
+            self.logger.log(level, msg, *args, stacklevel=2)
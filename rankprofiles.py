@@ -0,0 +1,70 @@
+"""
+Per commander state.
+
+Each commander (and beta flag) gets its own RankCore, with its config keys under its own prefix.  Only the
+active commander's profile is loaded at startup, others are loaded when the game switches to them and kept in a
+small LRU so switching back and forth between accounts is instant without holding every profile ever used.
+"""
+from collections import OrderedDict
+
+# Keys RankCore used before state was kept per commander, see migrate_legacy
+LEGACY_PREFIX = "edrp_"
+LEGACY_KEYS = ("last_combat", "last_trade", "last_explore", "last_soldier", "last_exobiologist", "last_empire",
+               "last_federation", "last_combat_rank", "last_trade_rank", "last_explore_rank", "last_soldier_rank",
+               "last_exobiologist_rank", "last_empire_rank", "last_federation_rank")
+
+
+def profile_prefix(cmdr, is_beta):
+    """
+    The config key prefix for a commander's state, the legacy keys until we know who the commander is
+    """
+    if cmdr is None:
+        return LEGACY_PREFIX
+    return f"edrp_{'beta_' if is_beta else ''}{cmdr}_"
+
+
+def migrate_legacy(store, prefix):
+    """
+    Give the first commander profile created the ranks and progress saved before state was per commander
+    """
+    if store.get_int("edrp_profiles_migrated"):
+        return
+    for key in LEGACY_KEYS:
+        store.set(prefix + key, store.get_int(LEGACY_PREFIX + key))
+    store.set("edrp_profiles_migrated", 1)
+
+
+class ProfileCache(object):
+    """
+    LRU of loaded commander profiles
+    """
+    SIZE = 4
+
+    def __init__(self, create, evict=None, size=SIZE):
+        """
+        :param create: callable(cmdr, is_beta) returning a new profile
+        :param evict: optional callable(cmdr, is_beta, profile) called when a profile is dropped from the cache
+        :param size: how many profiles to keep loaded
+        """
+        self.create = create
+        self.evict = evict
+        self.size = size
+        self.profiles = OrderedDict()
+
+    def get(self, cmdr, is_beta):
+        """
+        The profile for a commander, loading it if needed
+        """
+        key = (cmdr, bool(is_beta))
+        profile = self.profiles.get(key)
+        if profile is not None:
+            self.profiles.move_to_end(key)
+            return profile
+
+        profile = self.create(cmdr, is_beta)
+        self.profiles[key] = profile
+        if len(self.profiles) > self.size:
+            (old_cmdr, old_beta), old = self.profiles.popitem(last=False)
+            if self.evict is not None:
+                self.evict(old_cmdr, old_beta, old)
+        return profile
@@ -0,0 +1,109 @@
+"""
+Rolling rates: %/hour per rank track, credits/hour per session counter and the time to the next rank.
+
+Each series keeps a fixed size ring buffer of (timestamp, cumulative value) samples covering at most WINDOW
+seconds.  A rate is the change between the oldest and newest sample divided by the time from the oldest sample
+to now, so it falls off while nothing is earned.  Adding a sample and reading a rate are O(1) apart from dropping
+samples that have aged out of the window, nothing rescans the history.
+"""
+import time
+from collections import deque
+from datetime import datetime
+
+SAMPLES = 64
+WINDOW = 2 * 60 * 60  # seconds
+MIN_SPAN = 60  # seconds, below this a rate is mostly noise
+
+
+def journal_time(entry):
+    """
+    The time of a journal entry as a unix timestamp, now if it has none
+    """
+    try:
+        return datetime.fromisoformat(entry["timestamp"].replace("Z", "+00:00")).timestamp()
+    except (KeyError, AttributeError, ValueError):
+        return time.time()
+
+
+class RateWindow(object):
+    """
+    Ring buffer of (timestamp, cumulative value) samples
+    """
+    __slots__ = ("samples", "window")
+
+    def __init__(self, size=SAMPLES, window=WINDOW):
+        self.samples = deque(maxlen=size)
+        self.window = window
+
+    def add(self, t, value):
+        self.samples.append((t, value))
+        self.trim(t)
+
+    def trim(self, now):
+        """
+        Drop the samples older than the window
+        """
+        samples = self.samples
+        while samples and samples[0][0] < now - self.window:
+            samples.popleft()
+
+    def per_hour(self, now):
+        """
+        :param now: unix timestamp to measure the rate up to, the newest sample's time if that is later
+        :return: the rate per hour, None if there is not enough data
+        """
+        self.trim(now)
+        samples = self.samples
+        if len(samples) < 2:
+            return None
+        t0, v0 = samples[0]
+        t1, v1 = samples[-1]
+        span = max(now, t1) - t0
+        if span < MIN_SPAN:
+            return None
+        return (v1 - v0) * 3600 / span
+
+
+class RateEngine(object):
+    """
+    Rates for every rank track and session counter
+    """
+
+    def __init__(self, tracks, credit_keys, size=SAMPLES, window=WINDOW, clock=time.time):
+        """
+        :param tracks: names of the rank tracks, e.g. "Combat"
+        :param credit_keys: names of the credit counters, e.g. "bounties_value"
+        :param clock: returns the unix time the rates are measured up to
+        """
+        self.clock = clock
+        self.tracks = {track: RateWindow(size, window) for track in tracks}
+        self.credits = {key: RateWindow(size, window) for key in credit_keys}
+
+    def add_progress(self, track, t, rank, pct):
+        # Progress carries on across a rank up: rank 3 at 95% then rank 4 at 5% is 10% of progress
+        self.tracks[track].add(t, rank * 100 + pct)
+
+    def add_credits(self, key, t, total):
+        self.credits[key].add(t, total)
+
+    def reset_credits(self):
+        """
+        Forget the credit samples, e.g. when the counters are restored and jump
+        """
+        for window in self.credits.values():
+            window.samples.clear()
+
+    def pct_per_hour(self, track):
+        return self.tracks[track].per_hour(self.clock())
+
+    def eta_hours(self, track, pct):
+        """
+        Estimated hours to the next rank at the current rate, None if we're not progressing
+        """
+        rate = self.pct_per_hour(track)
+        if not rate or rate <= 0:
+            return None
+        return (100 - pct) / rate
+
+    def credits_per_hour(self, key):
+        return self.credits[key].per_hour(self.clock())
@@ -0,0 +1,99 @@
+"""
+Coalesced label rendering.
+
+Bursts of journal events (bounties, bonds, sales) each ask for a redraw.  LabelRenderer collapses them into a
+single redraw on the Tk idle queue, and only assigns text to labels whose text actually changed, so Tk only
+does geometry work for labels that need it.
+"""
+from functools import lru_cache
+
+
+@lru_cache(maxsize=512)
+def pct_text(pct):
+    return f"{pct}%"
+
+
+@lru_cache(maxsize=512)
+def rank_pct_text(rank_name, pct):
+    return f"{rank_name}  {pct}%"
+
+
+def estimate_text(pct):
+    """
+    A provisional percentage, e.g. "~52.4%"
+    """
+    return "~{:.1f}%".format(pct)
+
+
+def kcr_text(value):
+    return "{:,.0f}Kcr".format(value / 1000)
+
+
+def eta_text(hours):
+    if hours < 1:
+        return "{:.0f}m".format(hours * 60)
+    if hours < 48:
+        return "{:.1f}h".format(hours)
+    return "{:.0f}d".format(hours / 24)
+
+
+def rate_text(pct_per_hour, eta_hours):
+    """
+    Rate suffix for a progress label, e.g. " +2.5%/h 3.4h"
+    """
+    if not pct_per_hour:
+        return ""
+    if eta_hours is None:
+        return " {:+.1f}%/h".format(pct_per_hour)
+    return " {:+.1f}%/h {}".format(pct_per_hour, eta_text(eta_hours))
+
+
+def kcr_rate_text(per_hour):
+    if not per_hour:
+        return ""
+    return " {:,.0f}Kcr/h".format(per_hour / 1000)
+
+
+class LabelRenderer(object):
+    """
+    Schedules at most one pending redraw and skips label updates that would not change the text.
+    """
+
+    def __init__(self, render):
+        """
+        :param render: callback that redraws the UI, it should use set_text to update labels
+        """
+        self.render = render
+        self.widget = None
+        self.pending = None
+        self.texts = dict()
+
+    def attach(self, widget):
+        """
+        Attach to the widget whose idle queue we use, nothing is drawn until this is called
+        """
+        self.widget = widget
+        self.reset()
+
+    def reset(self):
+        """
+        Forget the label text cache, call this when the labels have been recreated
+        """
+        self.texts.clear()
+
+    def request(self):
+        """
+        Ask for a redraw, all requests made before Tk is next idle are served by one redraw
+        """
+        if self.widget is None or self.pending is not None:
+            return
+        self.pending = self.widget.after_idle(self.redraw)
+
+    def redraw(self):
+        self.pending = None
+        self.render()
+
+    def set_text(self, label, text):
+        if self.texts.get(label) != text:
+            self.texts[label] = text
+            label["text"] = text
@@ -0,0 +1,151 @@
+"""
+Crash safe snapshot files.
+
+A snapshot is SNAPSHOT_MAGIC, a header (format version, CRC32 and length of the payload) and the payload, zlib
+compressed JSON.  It is written to a temporary file, synced to disk and renamed over the previous snapshot, so a
+crash at any point leaves either the old snapshot or the new one, and the checksum catches a file the disk never
+finished writing.
+
+Snapshotter decides when to write: once DIRTY_LIMIT changes have been made, or DELAY_MS after the first change,
+whichever comes first, so a burst of events costs one write rather than one per event.  SnapshotWriter does the
+encoding, compression and disk writes on its own thread, so they never stall EDMC's UI.
+"""
+import json
+import os
+import queue
+import struct
+import threading
+import zlib
+
+from ranklogger import RankLogger
+
+LOG = RankLogger()
+
+SNAPSHOT_MAGIC = b"EDRPSNP1"
+SNAPSHOT_VERSION = 1
+HEADER = struct.Struct("<HII")  # format version, CRC32 of the payload, payload length
+COMPRESSION = 6  # zlib level
+
+
+def write_snapshot(path, state):
+    """
+    Atomically replace the snapshot at path with state, anything json can encode
+    """
+    payload = zlib.compress(json.dumps(state, separators=(",", ":")).encode("utf-8"), COMPRESSION)
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(SNAPSHOT_MAGIC + HEADER.pack(SNAPSHOT_VERSION, zlib.crc32(payload), len(payload)) + payload)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def read_snapshot(path):
+    """
+    :return: the state saved at path, None if there is no snapshot or it is damaged or from another version
+    """
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except OSError:
+        return None
+    start = len(SNAPSHOT_MAGIC) + HEADER.size
+    if len(data) < start or not data.startswith(SNAPSHOT_MAGIC):
+        LOG.log("Ignoring %s, it is not a snapshot", "WARNING", path)
+        return None
+    version, crc, length = HEADER.unpack_from(data, len(SNAPSHOT_MAGIC))
+    payload = data[start:start + length]
+    if version != SNAPSHOT_VERSION:
+        LOG.log("Ignoring snapshot %s version %s", "WARNING", path, version)
+        return None
+    if len(payload) != length or zlib.crc32(payload) != crc:
+        LOG.log("Ignoring damaged snapshot %s", "WARNING", path)
+        return None
+    try:
+        return json.loads(zlib.decompress(payload))
+    except (zlib.error, ValueError) as e:
+        LOG.log("Ignoring unreadable snapshot %s: %s", "WARNING", path, e)
+        return None
+
+
+class SnapshotWriter(object):
+    """
+    Writes snapshots on a background thread.  Only the newest state matters, so states queued while a write is in
+    progress are skipped apart from the last one.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.queue = queue.SimpleQueue()
+        self.thread = threading.Thread(target=self.write_loop, name="EDRankProgress snapshot", daemon=True)
+        self.thread.start()
+
+    def write(self, state):
+        """
+        Queue a state to write, it must not be changed afterwards
+        """
+        self.queue.put(state)
+
+    def close(self, timeout=10.0):
+        """
+        Write anything queued and stop the thread, call this at shutdown
+        """
+        self.queue.put(None)
+        self.thread.join(timeout)
+
+    def write_loop(self):
+        running = True
+        while running:
+            state = self.queue.get()
+            while not self.queue.empty():
+                newer = self.queue.get()
+                if newer is None:
+                    running = False
+                else:
+                    state = newer
+            if state is None:
+                break
+            try:
+                write_snapshot(self.path, state)
+            except OSError as e:
+                LOG.log("Unable to save snapshot %s: %s", "WARNING", self.path, e)
+
+
+class Snapshotter(object):
+    """
+    Counts changes and calls save when enough have been made or enough time has passed
+    """
+    DIRTY_LIMIT = 100
+    DELAY_MS = 30000
+
+    def __init__(self, save, schedule=None, dirty_limit=DIRTY_LIMIT, delay_ms=DELAY_MS):
+        """
+        :param save: callable that writes the snapshot
+        :param schedule: optional callable(delay_ms, callback), e.g. a Tk widget's after method
+        """
+        self.save = save
+        self.schedule = schedule
+        self.dirty_limit = dirty_limit
+        self.delay_ms = delay_ms
+        self.dirty = 0
+        self.pending = None
+
+    def changed(self):
+        self.dirty += 1
+        if self.dirty >= self.dirty_limit:
+            self.flush()
+        elif self.pending is None and self.schedule is not None:
+            self.pending = self.schedule(self.delay_ms, self.flush)
+
+    def flush(self):
+        """
+        Save now if anything changed, this is also what the timer calls
+        """
+        self.pending = None
+        if not self.dirty:
+            return
+        self.dirty = 0
+        try:
+            self.save()
+        except OSError as e:
+            LOG.log("Unable to save snapshot: %s", "WARNING", e)
@@ -0,0 +1,79 @@
+"""
+The rank tracks and the rank and progress held for each of them.
+
+Everything that deals with the rank tracks (applying Rank and Progress events, saving to config, logging,
+drawing) loops over TRACKS, so a new track only needs adding here.  RankState keeps the values in two small
+lists indexed by track rather than an attribute per track, which makes copying it, diffing it and taking an
+immutable snapshot for history cheap.
+"""
+
+# The journal's name for each track, in display order
+TRACKS = ("Combat", "Trade", "Explore", "Soldier", "Exobiologist", "Empire", "Federation")
+TRACK_INDEX = {track: i for i, track in enumerate(TRACKS)}
+# Lower case names, used in config keys and the stats server, e.g. last_combat and last_combat_rank
+TRACK_KEYS = tuple(track.lower() for track in TRACKS)
+# Short names for the log
+TRACK_ABBREVIATIONS = ("Com", "Trd", "Exp", "Merc", "Exo", "Emp", "Fed")
+
+
+class RankState(object):
+    """
+    Rank and progress percentage for every track
+    """
+    __slots__ = ("ranks", "progress")
+
+    def __init__(self, ranks=None, progress=None):
+        self.ranks = list(ranks) if ranks is not None else [0] * len(TRACKS)
+        self.progress = list(progress) if progress is not None else [0] * len(TRACKS)
+
+    def rank(self, track):
+        return self.ranks[TRACK_INDEX[track]]
+
+    def pct(self, track):
+        return self.progress[TRACK_INDEX[track]]
+
+    @staticmethod
+    def apply(values, entry):
+        """
+        Copy the tracks present in a Rank or Progress entry into values
+        :return: the indexes of the tracks in the entry, and of the ones that changed
+        """
+        present = []
+        changed = []
+        for i, track in enumerate(TRACKS):
+            value = entry.get(track)
+            if value is None:
+                continue  # e.g. Soldier and Exobiologist before Odyssey
+            present.append(i)
+            if values[i] != value:
+                values[i] = value
+                changed.append(i)
+        return present, changed
+
+    def set_ranks(self, entry):
+        return self.apply(self.ranks, entry)
+
+    def set_progress(self, entry):
+        return self.apply(self.progress, entry)
+
+    def copy(self):
+        return RankState(self.ranks, self.progress)
+
+    def snapshot(self):
+        """
+        An immutable copy, (ranks, progress) tuples in TRACKS order
+        """
+        return tuple(self.ranks), tuple(self.progress)
+
+    def diff(self, other):
+        """
+        :return: the tracks whose rank or progress differ from another RankState
+        """
+        return [track for i, track in enumerate(TRACKS)
+                if self.ranks[i] != other.ranks[i] or self.progress[i] != other.progress[i]]
+
+    def __eq__(self, other):
+        return isinstance(other, RankState) and self.ranks == other.ranks and self.progress == other.progress
+
+    def __repr__(self):
+        return f"RankState(ranks={self.ranks}, progress={self.progress})"
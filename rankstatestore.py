@@ -0,0 +1,132 @@
+"""
+Write-behind persistence for the plugin's config values.
+
+EDMC's config writes go to the registry on Windows and to a file elsewhere, so writing every value on every
+Rank or Progress event stalls the UI. StateStore keeps the values in memory, remembers which keys changed and
+writes them back to config in one batch.
+
+All the values are kept in a single versioned JSON blob under one config key, so loading the plugin's state is
+one config read however many commanders and settings there are.  Values saved in the old one key per value
+layout are read from their own keys the first time they are asked for and move into the blob on the next flush.
+"""
+import json
+
+from ranklogger import RankLogger
+
+LOG = RankLogger()
+
+BLOB_KEY = "edrp_state"
+BLOB_VERSION = 1
+
+
+class StateStore(object):
+    """
+    In memory cache of config values with dirty tracking and batched flushes.
+
+    A flush happens after FLUSH_DELAY_MS once a value changes (when a scheduler is attached), or when flush() is
+    called directly, e.g. from plugin_stop or when the preferences close.
+    """
+    FLUSH_DELAY_MS = 2000
+
+    def __init__(self, backend, schedule=None, delay_ms=FLUSH_DELAY_MS, blob_key=BLOB_KEY):
+        """
+        :param backend: the config object to persist to, needs get_int and get_str(key, default=) and set(key, value)
+        :param schedule: optional callable(delay_ms, callback), e.g. a Tk widget's after method
+        :param delay_ms: how long to wait after the first change before flushing
+        :param blob_key: the config key holding all the values
+        """
+        self.backend = backend
+        self.schedule = schedule
+        self.delay_ms = delay_ms
+        self.blob_key = blob_key
+        self.dirty = False
+        self.pending = None
+        self.values = self.load()
+        self.legacy = self.values is None  # No blob yet, fall back to the old per key values
+        if self.legacy:
+            self.values = dict()
+
+    def load(self):
+        """
+        Read the blob, one config read
+        :return: the values, None if there is no blob we can use
+        """
+        blob = self.backend.get_str(self.blob_key, default=None)
+        if not blob:
+            return None
+        try:
+            state = json.loads(blob)
+            if state.get("version") == BLOB_VERSION:
+                return state["values"]
+            LOG.log("Ignoring saved state version %s", "WARNING", state.get("version"))
+        except (ValueError, KeyError, AttributeError) as e:
+            LOG.log("Ignoring unreadable saved state: %s", "WARNING", e)
+        return None
+
+    def get_int(self, key, default=0):
+        """
+        Get a value, the backend is only read for values still in the old layout
+        """
+        return self.get(key, default, self.backend.get_int)
+
+    def get_str(self, key, default=None):
+        return self.get(key, default, self.backend.get_str)
+
+    def get(self, key, default, read):
+        try:
+            return self.values[key]
+        except KeyError:
+            pass
+        if not self.legacy:
+            return default
+        value = read(key, default=default)
+        if value != default:  # Migrate it into the blob
+            self.values[key] = value
+            self.dirty = True
+            self.request_flush()
+        return value
+
+    def set(self, key, value):
+        """
+        Set a value, it is written to the backend on the next flush.  Unchanged values are ignored.
+        """
+        if key in self.values and self.values[key] == value:
+            return
+        self.values[key] = value
+        self.dirty = True
+        self.request_flush()
+
+    def request_flush(self):
+        # All changes made until the timer fires go out in the same batch
+        if self.pending is None and self.schedule is not None:
+            self.pending = self.schedule(self.delay_ms, self.flush)
+
+    def flush(self):
+        """
+        Write the blob to the backend if anything changed
+        """
+        self.pending = None
+        if not self.dirty:
+            return
+        self.dirty = False
+        self.backend.set(self.blob_key, json.dumps({"version": BLOB_VERSION, "values": self.values},
+                                                   separators=(",", ":")))
+        LOG.log("Flushed %d config values", "DEBUG", len(self.values))
+
+
+class MemoryConfig(object):
+    """
+    A stand in for EDMC's config when running without EDMC, values only live in memory
+    """
+
+    def __init__(self, values=None):
+        self.values = dict(values or {})
+
+    def get_int(self, key, default=0):
+        return self.values.get(key, default)
+
+    def get_str(self, key, default=None):
+        return self.values.get(key, default)
+
+    def set(self, key, value):
+        self.values[key] = value
@@ -0,0 +1,239 @@
+"""
+Read only stats server for stream overlays.
+
+StatServer runs an asyncio HTTP server on localhost on its own thread:
+
+    GET /stats  the current state as JSON, with an ETag so pollers get a 304 when nothing changed
+    GET /ws     a WebSocket, the full state is sent on connect and then only the fields that changed
+
+The Tk thread hands each new state to publish(), which just passes the dict to the server's loop.  Everything
+else (diffing, JSON encoding, serving requests) happens on the server thread, so however often overlays poll it
+never costs EDMC's UI thread anything.
+"""
+import asyncio
+import base64
+import hashlib
+import json
+import threading
+import time
+
+from ranklogger import RankLogger
+
+LOG = RankLogger()
+
+HOST = "127.0.0.1"
+PORT = 8765
+WS_GUID = b"258EAFA5-E914-47DA-95CA-C5AB0DC11B36"
+MAX_REQUEST = 8192  # bytes of request line and headers
+
+
+def ws_frame(payload, opcode=0x1):
+    """
+    An unmasked, unfragmented WebSocket frame, as sent by a server
+    """
+    size = len(payload)
+    if size < 126:
+        header = bytes((0x80 | opcode, size))
+    elif size < 1 << 16:
+        header = bytes((0x80 | opcode, 126)) + size.to_bytes(2, "big")
+    else:
+        header = bytes((0x80 | opcode, 127)) + size.to_bytes(8, "big")
+    return header + payload
+
+
+async def ws_read(reader):
+    """
+    Read one frame from a client
+    :return: (opcode, payload)
+    """
+    head = await reader.readexactly(2)
+    opcode = head[0] & 0x0F
+    size = head[1] & 0x7F
+    if size == 126:
+        size = int.from_bytes(await reader.readexactly(2), "big")
+    elif size == 127:
+        size = int.from_bytes(await reader.readexactly(8), "big")
+    if size > MAX_REQUEST:
+        raise ValueError("WebSocket frame too large")
+    mask = await reader.readexactly(4) if head[1] & 0x80 else None
+    payload = await reader.readexactly(size)
+    if mask is not None:
+        payload = bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+    return opcode, payload
+
+
+class Subscriber(object):
+    """
+    A WebSocket client, changes not yet sent are merged so a slow client only ever has one message waiting
+    """
+    __slots__ = ("pending", "ready")
+
+    def __init__(self, state):
+        self.pending = dict(state)
+        self.ready = asyncio.Event()
+        self.ready.set()
+
+    def add(self, changes):
+        self.pending.update(changes)
+        self.ready.set()
+
+
+class StatServer(object):
+    """
+    The server and its thread
+    """
+
+    def __init__(self, host=HOST, port=PORT):
+        self.host = host
+        self.port = port
+        self.state = dict()
+        self.version = 0
+        self.session = int(time.time())  # So ETags from before a restart don't match
+        self.body = b"{}"
+        self.subscribers = set()
+        self.loop = None
+        self.server = None
+        self.thread = None
+        self.started = threading.Event()
+
+    def start(self):
+        """
+        Start the server thread and wait for it to listen
+        :return: True if the server is running, False if it couldn't start
+        """
+        self.thread = threading.Thread(target=self.run, name="EDRankProgress stats server", daemon=True)
+        self.thread.start()
+        self.started.wait(5.0)
+        return self.loop is not None
+
+    def stop(self):
+        loop, self.loop = self.loop, None  # Nothing more is published
+        if loop is not None and self.thread.is_alive():
+            loop.call_soon_threadsafe(loop.stop)
+            self.thread.join(5.0)
+
+    def publish(self, state):
+        """
+        Hand a new state to the server, this is safe to call from any thread and does no work on it
+        """
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self.update, state)
+
+    def run(self):
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)  # This thread's loop
+        try:
+            self.server = loop.run_until_complete(asyncio.start_server(self.handle, self.host, self.port))
+            LOG.log("Stats server listening on http://%s:%d/stats", "INFO", self.host, self.port)
+        except Exception as e:  # OSError if the port is in use, OverflowError if it is out of range...
+            LOG.log("Unable to start the stats server on port %s: %s", "WARNING", self.port, e)
+            loop.close()
+            self.started.set()
+            return
+        self.loop = loop
+        self.started.set()
+        try:
+            loop.run_forever()
+        finally:
+            self.server.close()
+            tasks = asyncio.all_tasks(loop)
+            for task in tasks:
+                task.cancel()
+            # Let the cancelled connections finish, so their CancelledErrors aren't reported as unhandled
+            loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+            loop.close()
+
+    def update(self, state):
+        """
+        Apply a new state, on the server thread
+        """
+        changes = {key: value for key, value in state.items() if self.state.get(key) != value}
+        if not changes:
+            return
+        self.state = dict(state)
+        self.version += 1
+        self.body = json.dumps(self.state, separators=(",", ":")).encode("utf-8")
+        for subscriber in self.subscribers:
+            subscriber.add(changes)
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                try:
+                    request = await reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+                    break
+                if len(request) > MAX_REQUEST:
+                    break
+                lines = request.decode("latin-1").split("\r\n")
+                parts = lines[0].split()
+                headers = dict()
+                for line in lines[1:]:
+                    name, _, value = line.partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                if len(parts) != 3 or parts[0] != "GET":
+                    self.respond(writer, "405 Method Not Allowed", b"", close=True)
+                    break
+                path = parts[1].split("?")[0]
+                if path == "/ws" and headers.get("upgrade", "").lower() == "websocket":
+                    await self.websocket(reader, writer, headers)
+                    break
+                close = headers.get("connection", "").lower() == "close"
+                if path in ("/", "/stats"):
+                    etag = f'"{self.session}-{self.version}"'
+                    if headers.get("if-none-match") == etag:
+                        self.respond(writer, "304 Not Modified", b"", etag=etag, close=close)
+                    else:
+                        self.respond(writer, "200 OK", self.body, etag=etag, close=close)
+                else:
+                    self.respond(writer, "404 Not Found", b"", close=close)
+                await writer.drain()
+                if close:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        except asyncio.CancelledError:
+            pass  # The server is stopping, finish quietly rather than have the stream report the cancellation
+        finally:
+            writer.close()
+
+    @staticmethod
+    def respond(writer, status, body, etag=None, close=False):
+        headers = [f"HTTP/1.1 {status}", "Content-Type: application/json", f"Content-Length: {len(body)}",
+                   "Cache-Control: no-cache", "Access-Control-Allow-Origin: *"]
+        if etag is not None:
+            headers.append(f"ETag: {etag}")
+        if close:
+            headers.append("Connection: close")
+        writer.write(("\r\n".join(headers) + "\r\n\r\n").encode("latin-1") + body)
+
+    async def websocket(self, reader, writer, headers):
+        key = headers.get("sec-websocket-key", "").encode("latin-1")
+        accept = base64.b64encode(hashlib.sha1(key + WS_GUID).digest()).decode("latin-1")
+        writer.write(("HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                      f"Sec-WebSocket-Accept: {accept}\r\n\r\n").encode("latin-1"))
+        subscriber = Subscriber(self.state)
+        self.subscribers.add(subscriber)
+        sender = asyncio.ensure_future(self.send_changes(subscriber, writer))
+        try:
+            while True:
+                opcode, payload = await ws_read(reader)
+                if opcode == 0x8:  # Close
+                    writer.write(ws_frame(payload[:2], 0x8))
+                    break
+                if opcode == 0x9:  # Ping
+                    writer.write(ws_frame(payload, 0xA))
+        finally:
+            self.subscribers.discard(subscriber)
+            sender.cancel()
+
+    @staticmethod
+    async def send_changes(subscriber, writer):
+        while True:
+            await subscriber.ready.wait()
+            subscriber.ready.clear()
+            changes = subscriber.pending
+            subscriber.pending = dict()
+            if changes:
+                writer.write(ws_frame(json.dumps(changes, separators=(",", ":")).encode("utf-8")))
+                await writer.drain()
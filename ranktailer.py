@@ -0,0 +1,185 @@
+"""
+Headless rank tracking, without EDMC or Tk.
+
+This tool follows the game's journal directory the way EDMC does and feeds the events to RankCore, the same
+handlers the plugin uses, writing the stats to a JSON snapshot file for other tools to read:
+
+    python ranktailer.py JOURNAL_DIR --snapshot rankprogress.json
+    python ranktailer.py JOURNAL_DIR --snapshot rankprogress.json --ledger ledger.db --state tailer.edrp
+
+At startup the journals already on disk are backfilled, as the plugin does, then the newest journal is tailed
+from the byte offset reached, reading only the bytes appended since the last poll.  When the game starts a new
+journal we finish the old one and move on to it.  Polling backs off while the game is idle and comes straight
+back to the fastest rate when new data arrives.
+"""
+import argparse
+import json
+import os
+import signal
+import sys
+import threading
+import time
+
+from rankbackfill import Backfill
+from rankjournals import commander_name, event_name, journal_files, parse, read_lines
+from rankledger import Ledger
+from rankcore import EVENT_HANDLERS, LOG, headless_core
+
+HANDLED_EVENTS = frozenset(name.encode() for name in EVENT_HANDLERS)
+COMMANDER_EVENTS = (b"Commander", b"LoadGame")
+
+
+class JournalTailer(object):
+    """
+    Follows the newest journal in a directory
+    """
+    MIN_POLL = 0.25  # seconds
+    MAX_POLL = 8.0
+
+    def __init__(self, journal_dir, core, name=None, offset=0, cmdr=None):
+        """
+        :param journal_dir: the game's journal directory
+        :param core: the RankCore to feed
+        :param name: the journal to start from, the newest by default
+        :param offset: the byte offset to start from in that journal
+        :param cmdr: the commander, until a journal tells us
+        """
+        self.journal_dir = journal_dir
+        self.core = core
+        self.name = name
+        self.offset = offset
+        self.cmdr = cmdr
+        self.interval = self.MIN_POLL
+        if self.name is None:
+            self.next_file()
+
+    def next_file(self):
+        """
+        Move to the next journal if the game has started one
+        :return: True if we moved
+        """
+        newer = [f.name for f in journal_files(self.journal_dir) if self.name is None or f.name > self.name]
+        if not newer:
+            return False
+        if self.name is None:
+            self.name = newer[-1]  # Starting up, from the offset we were given
+        else:
+            self.name = newer[0]
+            self.offset = 0
+        LOG.log("Following %s", "INFO", self.name)
+        return True
+
+    def poll(self):
+        """
+        Read what has been appended since the last poll
+        :return: the number of lines read
+        """
+        if self.name is None:
+            return 0
+        path = os.path.join(self.journal_dir, self.name)
+        try:
+            size = os.stat(path).st_size
+        except OSError:
+            size = self.offset
+        if size < self.offset:  # Rewritten, start again
+            self.offset = 0
+        lines = 0
+        if size > self.offset:
+            for end, line in read_lines(path, self.offset):
+                self.offset = end
+                self.dispatch(line)
+                lines += 1
+        elif self.next_file():  # Nothing new in this one, the game may have moved on
+            lines = self.poll()
+        return lines
+
+    def dispatch(self, line):
+        name = event_name(line)
+        if name in COMMANDER_EVENTS:
+            self.cmdr = commander_name(line) or self.cmdr
+        elif name in HANDLED_EVENTS:
+            entry = parse(line)
+            if entry:
+                self.core.journal_entry(self.cmdr, False, None, None, entry, None)
+
+    def wait_time(self, lines):
+        """
+        How long to sleep before the next poll, backing off while nothing is happening
+        """
+        if lines:
+            self.interval = self.MIN_POLL
+        else:
+            self.interval = min(self.interval * 2, self.MAX_POLL)
+        return self.interval
+
+
+def write_snapshot(path, state):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f, separators=(",", ":"))
+    os.replace(tmp, path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Track rank progress from the journals without EDMC")
+    parser.add_argument("journal_dir", help="the game's journal directory")
+    parser.add_argument("--snapshot", default="rankprogress.json", help="stats file to keep up to date")
+    parser.add_argument("--interval", type=float, default=5.0, help="seconds between snapshot updates")
+    parser.add_argument("--state", default="tailer.edrp", help="checkpoint file, see rankbackfill.py")
+    parser.add_argument("--ledger", default=None, help="record rewards in this ledger database")
+    parser.add_argument("--once", action="store_true", help="read what is there now, write the snapshot and exit")
+    args = parser.parse_args(argv)
+
+    core = headless_core()
+    if args.ledger:
+        core.ledger = Ledger(args.ledger)
+    backfill = Backfill(args.journal_dir, args.state)
+    entries = backfill.scan()
+    if core.ledger is None:
+        backfill.apply(core, entries)
+    else:
+        backfill.apply(core, entries, restore_totals=False)
+        core.ledger.flush()
+        core.set_session_totals(core.ledger.today(backfill.cmdr))
+    core.cmdr = backfill.cmdr
+
+    files = journal_files(args.journal_dir)
+    name = files[-1].name if files else None
+    offset = backfill.checkpoint["files"].get(name, (0, None))[0] if name else 0
+    tailer = JournalTailer(args.journal_dir, core, name, offset, backfill.cmdr)
+
+    stop = threading.Event()
+    signal.signal(signal.SIGINT, lambda *_: stop.set())
+    if hasattr(signal, "SIGTERM"):
+        signal.signal(signal.SIGTERM, lambda *_: stop.set())
+
+    written = None
+    next_write = 0.0
+    following = tailer.name
+    while True:
+        lines = tailer.poll()
+        if tailer.name != following:
+            backfill.new_journal()
+            following = tailer.name
+        now = time.monotonic()
+        if now >= next_write or stop.is_set() or args.once:
+            state = core.state()
+            if state != written:
+                state["updated"] = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+                write_snapshot(args.snapshot, state)
+                del state["updated"]
+                written = state
+                backfill.save(core, tailer.cmdr)  # So a crash or kill only loses the last interval
+            next_write = now + args.interval
+        if stop.is_set() or args.once:
+            break
+        stop.wait(tailer.wait_time(lines))
+
+    backfill.save(core, tailer.cmdr)
+    if core.ledger is not None:
+        core.ledger.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
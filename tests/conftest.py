@@ -0,0 +1,17 @@
+import os
+import sys
+
+import pytest
+
+# The plugin is a flat folder of modules, as EDMC loads it
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rankcore import headless_core  # noqa: E402
+
+
+@pytest.fixture
+def new_core():
+    """
+    Makes headless RankCores, with their config in memory
+    """
+    return headless_core
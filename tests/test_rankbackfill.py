@@ -0,0 +1,73 @@
+import json
+
+from rankbackfill import Backfill, utc_today
+
+
+def write_journal(journal_dir, cmdr, events, start="000000"):
+    today = utc_today()
+    lines = [{"timestamp": f"{today}T00:00:00Z", "event": "Commander", "Name": cmdr}]
+    lines += [dict(timestamp=f"{today}T00:00:{i:02d}Z", **event) for i, event in enumerate(events, 1)]
+    path = journal_dir / f"Journal.{today}T{start}.01.log"
+    path.write_text("".join(json.dumps(line, separators=(", ", ":")) + "\n" for line in lines))
+    return path
+
+
+def test_each_commander_keeps_their_own_state(tmp_path, new_core):
+    write_journal(tmp_path, "Jameson", [{"event": "Bounty", "TotalReward": 1000}])
+    checkpoint = str(tmp_path / "snapshot.edrp")
+    backfill = Backfill(str(tmp_path), checkpoint)
+    jameson = new_core()
+    backfill.run(jameson)
+    assert jameson.bounties_value == 1000
+    backfill.save(jameson)
+
+    # Switch to another commander, who buys cargo
+    backfill.keep(jameson, "Jameson")
+    alt = new_core()
+    alt.journal_entry("Alt", False, None, None, {"event": "MarketBuy", "Type": "gold", "Count": 4, "BuyPrice": 90},
+                      None)
+    backfill.save(alt, "Alt")
+
+    backfill = Backfill(str(tmp_path), checkpoint)
+    assert backfill.cmdr == "Alt"
+    restored = new_core()
+    backfill.restore(restored, "Alt")
+    assert restored.cargo.count("gold") == 4
+    restored = new_core()
+    backfill.restore(restored, "Jameson")
+    assert restored.bounties_value == 1000
+
+
+def test_checkpoint_from_before_profiles_is_read(tmp_path, new_core):
+    write_journal(tmp_path, "Jameson", [])
+    legacy = tmp_path / "backfill.json"
+    legacy.write_text(json.dumps({"version": Backfill.CHECKPOINT_VERSION, "files": {}, "cmdr": "Jameson",
+                                  "day": utc_today(), "totals": {"bonds": 2, "bonds_value": 80000}}))
+    backfill = Backfill(str(tmp_path), str(tmp_path / "snapshot.edrp"), legacy_path=str(legacy))
+    core = new_core()
+    backfill.run(core)
+    assert core.bonds_value == 80000
+
+
+def test_save_finds_new_journals(tmp_path, new_core):
+    first = write_journal(tmp_path, "Jameson", [{"event": "Bounty", "TotalReward": 1000}])
+    backfill = Backfill(str(tmp_path), str(tmp_path / "snapshot.edrp"))
+    core = new_core()
+    backfill.run(core)
+    backfill.save(core)
+
+    # The first journal grew too, only the game starting a new one tells us about it
+    with first.open("a") as f:
+        f.write("{}\n")
+    second = write_journal(tmp_path, "Jameson", [], start="010000")
+    backfill.new_journal()
+    backfill.save(core)
+    files = backfill.checkpoint["files"]
+    assert files[first.name][0] == first.stat().st_size
+    assert files[second.name][0] == second.stat().st_size
+
+    # Without telling, the newest journal not growing gives the next one away
+    third = write_journal(tmp_path, "Jameson", [], start="020000")
+    backfill.save(core)
+    assert files[second.name][0] == second.stat().st_size
+    assert files[third.name][0] == third.stat().st_size
@@ -0,0 +1,50 @@
+from rankcapture import CaptureReader, CaptureWriter, replay
+
+T = 1792310400.0  # 2026-10-18T08:00:00Z
+
+
+def write_capture(path, records, close=True):
+    writer = CaptureWriter(str(path), block_records=4)
+    for i in range(records):
+        writer.record("Jameson", False, "Sol", None, {"event": "Bounty", "TotalReward": i}, t=T + i)
+    if close:
+        writer.close()
+    else:
+        writer.file.close()  # As if EDMC crashed, the blocks written so far but no index
+
+
+def test_round_trip(tmp_path):
+    path = tmp_path / "capture.edrp"
+    write_capture(path, 10)
+    reader = CaptureReader(str(path))
+    assert len(reader) == 10
+    assert len(reader.blocks) == 3
+    assert [record[5]["TotalReward"] for record in reader.entries()] == list(range(10))
+    assert [record[5]["TotalReward"] for record in reader.entries(6)] == [6, 7, 8, 9]
+    calls = []
+    assert replay(reader, lambda *args: calls.append(args)) == 10
+    assert calls[0] == ("Jameson", False, "Sol", None, {"event": "Bounty", "TotalReward": 0}, {})
+    reader.close()
+
+
+def test_seek_time(tmp_path):
+    path = tmp_path / "capture.edrp"
+    write_capture(path, 10)
+    reader = CaptureReader(str(path))
+    assert reader.seek_time(T - 60) == 0
+    assert reader.seek_time(T + 5) == 5  # Inside the second block
+    assert reader.seek_time(T + 3.5) == 4  # Between blocks
+    assert reader.seek_time(T + 60) == 10
+    reader.close()
+
+
+def test_unclosed_capture_is_read(tmp_path):
+    path = tmp_path / "capture.edrp"
+    write_capture(path, 12, close=False)
+    with open(path, "r+b") as f:
+        f.truncate(f.seek(0, 2) - 5)  # The last block cut short
+    reader = CaptureReader(str(path))
+    assert len(reader) == 8
+    assert [record[5]["TotalReward"] for record in reader.entries()] == list(range(8))
+    assert reader.seek_time(T + 5) == 5
+    reader.close()
@@ -0,0 +1,47 @@
+from rankcargo import CargoLedger, commodity_name
+
+
+def event(name, **fields):
+    return dict(timestamp="2026-10-18T10:00:00Z", event=name, **fields)
+
+
+def test_commodity_name():
+    assert commodity_name("$Painite_Name;") == "painite"
+    assert commodity_name("Painite") == "painite"
+    assert commodity_name("painite") == "painite"
+
+
+def test_seed_reconciles_the_hold():
+    cargo = CargoLedger()
+    cargo.buy("gold", 10, 9000)
+    cargo.buy("silver", 5, 4000)
+    cargo.seed({"gold": 4, "painite": 2})
+    assert cargo.snapshot() == {"gold": [[4, 9000]], "painite": [[2, None]]}
+
+
+def test_mined_cargo_is_sold_at_full_profit(new_core):
+    core = new_core()
+    for _ in range(3):
+        core.journal_entry("Jameson", False, "Sol", None, event("MiningRefined", Type="$Painite_Name;"), {})
+    core.journal_entry("Jameson", False, "Sol", None, event("MarketSell", Type="painite", Count=3, SellPrice=500000,
+                                                            AvgPricePaid=200000), {})
+    assert core.trade_profit == 1500000
+
+
+def test_cargo_event_without_inventory_reconciles_from_edmc_state(new_core):
+    core = new_core()
+    core.journal_entry("Jameson", False, "Sol", None, event("MarketBuy", Type="gold", Count=10, BuyPrice=9000), {})
+    core.journal_entry("Jameson", False, "Sol", None, event("CollectCargo", Type="$Painite_Name;", Stolen=False), {})
+    # The game only writes the Inventory at login, EDMC reads Cargo.json into its state for the rest
+    core.journal_entry("Jameson", False, "Sol", None, event("Cargo", Vessel="Ship", Count=6),
+                       {"Cargo": {"gold": 4, "painite": 2}})
+    assert core.cargo.snapshot() == {"gold": [[4, 9000]], "painite": [[1, 0], [1, None]]}
+
+
+def test_cargo_depot(new_core):
+    core = new_core()
+    depot = dict(MissionID=1, CargoType="$Gold_Name;", Count=8)
+    core.journal_entry("Jameson", False, "Sol", None, event("CargoDepot", UpdateType="Collect", **depot), None)
+    assert core.cargo.count("gold") == 8
+    core.journal_entry("Jameson", False, "Sol", None, event("CargoDepot", UpdateType="Deliver", **depot), None)
+    assert core.cargo.count("gold") == 0
@@ -0,0 +1,42 @@
+from rankledger import Ledger, utc_day_range
+
+T = "2026-10-18T10:00:00Z"
+
+
+def make_ledger(tmp_path):
+    return Ledger(str(tmp_path / "ledger.db"))
+
+
+def test_identical_events_in_the_same_second_are_kept(tmp_path):
+    ledger = make_ledger(tmp_path)
+    ledger.record(T, "Jameson", "bond", 1, 40000)
+    ledger.record(T, "Jameson", "bounty", 1, 12000)
+    ledger.record(T, "Jameson", "bond", 1, 40000)
+    ledger.flush()
+    totals = ledger.totals("Jameson", "2026-10-18", "2026-10-19")
+    ledger.close()
+    assert totals == {"bonds": 2, "bonds_value": 80000, "bounties": 1, "bounties_value": 12000}
+
+
+def test_replayed_events_are_ignored(tmp_path):
+    for _ in range(2):  # e.g. the backfill replaying what the last run recorded, after a crash
+        ledger = make_ledger(tmp_path)
+        ledger.record(T, "Jameson", "bond", 1, 40000)
+        ledger.record(T, "Jameson", "bounty", 1, 12000)
+        ledger.record(T, "Jameson", "bond", 1, 40000)
+        ledger.record("2026-10-18T10:00:01Z", "Jameson", "bond", 1, 40000)
+        ledger.flush()
+        totals = ledger.totals("Jameson", "2026-10-18", "2026-10-19")
+        ledger.close()
+        assert totals == {"bonds": 3, "bonds_value": 120000, "bounties": 1, "bounties_value": 12000}
+
+
+def test_today_later_has_only_what_was_recorded_before(tmp_path):
+    today = utc_day_range()[0]
+    ledger = make_ledger(tmp_path)
+    ledger.record(f"{today}T00:00:00Z", "Jameson", "bounty", 1, 12000)
+    pending = ledger.today_later("Jameson")
+    ledger.record(f"{today}T00:00:01Z", "Jameson", "bounty", 1, 500)
+    totals = pending.get(timeout=5.0)
+    ledger.close()
+    assert totals == {"bounties": 1, "bounties_value": 12000}
@@ -0,0 +1,19 @@
+from rankprofiles import LEGACY_PREFIX, ProfileCache, profile_prefix
+
+
+def test_profile_prefix():
+    assert profile_prefix(None, False) == LEGACY_PREFIX
+    assert profile_prefix("Jameson", False) == "edrp_Jameson_"
+    assert profile_prefix("Jameson", True) == "edrp_beta_Jameson_"
+
+
+def test_least_recently_used_profile_is_evicted():
+    evicted = []
+    cache = ProfileCache(lambda cmdr, is_beta: [cmdr, is_beta],
+                         evict=lambda cmdr, is_beta, profile: evicted.append((cmdr, is_beta, profile)), size=2)
+    first = cache.get("A", False)
+    cache.get("B", False)
+    assert cache.get("A", False) is first
+    cache.get("C", True)
+    assert evicted == [("B", False, ["B", False])]
+    assert list(cache.profiles) == [("A", False), ("C", True)]
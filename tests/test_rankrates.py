@@ -0,0 +1,36 @@
+from rankrates import MIN_SPAN, WINDOW, RateEngine, RateWindow
+
+
+def test_rate_falls_off_while_idle():
+    window = RateWindow()
+    for minute in range(11):  # 6,000Kcr/h of bounties for 10 minutes
+        window.add(minute * 60, minute * 100000)
+    assert window.per_hour(600) == 6000000
+    assert window.per_hour(1200) == 3000000  # 10 minutes idle
+
+
+def test_old_samples_are_dropped_when_read():
+    window = RateWindow()
+    window.add(0, 0)
+    window.add(600, 1000000)
+    assert window.per_hour(WINDOW) is not None
+    assert window.per_hour(WINDOW + 1) is None  # Only the last sample is left
+    assert len(window.samples) == 1
+
+
+def test_short_span_has_no_rate():
+    window = RateWindow()
+    window.add(0, 0)
+    window.add(10, 1000)
+    assert window.per_hour(MIN_SPAN - 1) is None
+
+
+def test_engine_measures_to_its_clock():
+    now = [600]
+    engine = RateEngine(["Combat"], ["bounties_value"], clock=lambda: now[0])
+    engine.add_progress("Combat", 0, 3, 90)
+    engine.add_progress("Combat", 600, 4, 0)
+    assert engine.pct_per_hour("Combat") == 60
+    assert engine.eta_hours("Combat", 0) == 100 / 60
+    now[0] = 1200
+    assert engine.pct_per_hour("Combat") == 30
@@ -0,0 +1,37 @@
+from ranksnapshot import HEADER, SNAPSHOT_MAGIC, SnapshotWriter, read_snapshot, write_snapshot
+
+STATE = {"cmdr": "Jameson", "tracks": [[5, 2], [55, 10]], "totals": {"bounties_value": 1000}}
+
+
+def test_round_trip(tmp_path):
+    path = str(tmp_path / "snapshot.edrp")
+    assert read_snapshot(path) is None
+    write_snapshot(path, STATE)
+    assert read_snapshot(path) == STATE
+
+
+def test_background_writer_writes_the_last_state(tmp_path):
+    path = str(tmp_path / "snapshot.edrp")
+    writer = SnapshotWriter(path)
+    writer.write({"cmdr": "Alt"})
+    writer.write(STATE)
+    writer.close()
+    assert read_snapshot(path) == STATE
+
+
+def test_truncated_snapshot_is_ignored(tmp_path):
+    path = tmp_path / "snapshot.edrp"
+    write_snapshot(str(path), STATE)
+    path.write_bytes(path.read_bytes()[:-5])
+    assert read_snapshot(str(path)) is None
+    path.write_bytes(SNAPSHOT_MAGIC[:4])
+    assert read_snapshot(str(path)) is None
+
+
+def test_bad_checksum_is_ignored(tmp_path):
+    path = tmp_path / "snapshot.edrp"
+    write_snapshot(str(path), STATE)
+    data = bytearray(path.read_bytes())
+    data[len(SNAPSHOT_MAGIC) + HEADER.size] ^= 1  # The first byte of the payload
+    path.write_bytes(bytes(data))
+    assert read_snapshot(str(path)) is None
@@ -0,0 +1,29 @@
+from rankstate import TRACKS, RankState
+
+
+def test_apply_reports_present_and_changed_tracks():
+    state = RankState()
+    present, changed = state.set_progress({"event": "Progress", "Combat": 55, "Trade": 0})
+    assert [TRACKS[i] for i in present] == ["Combat", "Trade"]
+    assert [TRACKS[i] for i in changed] == ["Combat"]
+    assert state.pct("Combat") == 55
+
+
+def test_copy_is_independent_and_equal():
+    state = RankState()
+    state.set_ranks({"Combat": 5})
+    copy = state.copy()
+    assert copy == state
+    copy.set_progress({"Explore": 10})
+    assert copy != state
+    assert state.pct("Explore") == 0
+
+
+def test_snapshot_and_diff():
+    state = RankState()
+    before = state.copy()
+    snapshot = state.snapshot()
+    state.set_progress({"Combat": 20, "Federation": 3})
+    assert state.diff(before) == ["Combat", "Federation"]
+    assert snapshot == (tuple([0] * len(TRACKS)), tuple([0] * len(TRACKS)))
+    assert RankState(*snapshot) == before
@@ -0,0 +1,22 @@
+import json
+
+import ranktailer
+from rankbackfill import utc_today
+
+
+def test_ranks_and_progress_survive_a_restart(tmp_path):
+    journals = tmp_path / "journals"
+    journals.mkdir()
+    today = utc_today()
+    events = [{"event": "Commander", "Name": "Jameson"}, {"event": "Rank", "Combat": 5, "Trade": 2},
+              {"event": "Progress", "Combat": 55, "Trade": 10}, {"event": "Bounty", "TotalReward": 1000}]
+    (journals / f"Journal.{today}T000000.01.log").write_text("".join(
+        json.dumps(dict(timestamp=f"{today}T00:00:{i:02d}Z", **event), separators=(", ", ":")) + "\n"
+        for i, event in enumerate(events)))
+    args = [str(journals), "--once", "--snapshot", str(tmp_path / "stats.json"), "--state", str(tmp_path / "t.edrp")]
+
+    for _ in range(2):
+        assert ranktailer.main(args) == 0
+        stats = json.loads((tmp_path / "stats.json").read_text())
+        assert (stats["combat"], stats["combat_rank"], stats["trade"], stats["trade_rank"]) == (55, 5, 10, 2)
+        assert stats["bounties_value"] == 1000